@@ -0,0 +1,3 @@
+"""
+Benchmarks for SeatingChart generation. Run with `python -m benchmarks.run`.
+"""
@@ -0,0 +1,168 @@
+"""
+Times each stage of SeatingChart generation over a grid of synthetic
+workloads, and saves the results as JSON so runs can be compared across
+commits.
+
+    python -m benchmarks.run --output before.json
+    python -m benchmarks.run --output after.json --compare before.json
+"""
+
+import argparse
+import gc
+import json
+import platform
+import subprocess
+import time
+import tracemalloc
+from typing import Any, Dict, List, Optional
+
+from seatingchart import GroupConflict, InvalidRequest, SeatingChart
+
+from benchmarks.workloads import DENSITIES, SETTINGS, SIZES, Workload, workloads
+
+Result = Dict[str, Any]
+
+STAGES = ["compile", "precheck", "together", "apart", "remaining", "validate"]
+
+
+def stages(workload: Workload) -> Dict[str, float]:
+    """
+    Generates a single chart with profiling on, returning the seconds spent
+    in each stage.
+    """
+    start = time.perf_counter()
+    chart = SeatingChart(profile=True, **workload.kwargs)
+    timings = {"compile": time.perf_counter() - start}
+
+    chart.new()
+    timings.update(chart.stats.timings)
+    timings["total"] = sum(timings.values())
+    return timings
+
+
+def peak_memory(workload: Workload) -> int:
+    """Returns the peak bytes allocated while building and generating a chart."""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        SeatingChart(**workload.kwargs).new()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak
+
+
+def measure(workload: Workload, repeat: int = 3, memory: bool = True) -> Result:
+    """
+    Times `workload` `repeat` times, keeping the fastest run of each stage.
+    Workloads the generator can't seat are reported with an `error` instead.
+    """
+    result: Result = {
+        "name": workload.name,
+        "size": workload.size,
+        "together_density": workload.together_density,
+        "apart_density": workload.apart_density,
+        "setting": workload.setting,
+    }
+    try:
+        runs = [stages(workload) for _ in range(repeat)]
+    except (GroupConflict, InvalidRequest) as error:
+        result["error"] = str(error)
+        return result
+
+    result["seconds"] = {
+        stage: min(run.get(stage, 0.0) for run in runs) for stage in STAGES + ["total"]
+    }
+    if memory:
+        result["peak_bytes"] = peak_memory(workload)
+    return result
+
+
+def metadata() -> Dict[str, Any]:
+    """Describes the commit and interpreter that produced a set of results."""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            universal_newlines=True,
+        ).stdout.strip()
+    except OSError:
+        commit = ""
+    return {
+        "commit": commit or None,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+    }
+
+
+def compare(results: List[Result], baseline: List[Result], threshold: float) -> int:
+    """
+    Prints the ratio of each workload's total time against `baseline`.
+
+    Returns:
+        int: Number of workloads that are more than `threshold` times slower.
+    """
+    previous = {result["name"]: result for result in baseline}
+    regressions = 0
+    for result in results:
+        if "error" in result or "seconds" not in previous.get(result["name"], {}):
+            continue
+        before = previous[result["name"]]["seconds"]["total"]
+        after = result["seconds"]["total"]
+        ratio = after / before if before else float("inf")
+        flag = ""
+        if ratio > threshold:
+            regressions += 1
+            flag = "  <-- regression"
+        print(
+            f"{result['name']:<48} {before:9.4f}s -> {after:9.4f}s  x{ratio:.2f}{flag}"
+        )
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES)
+    parser.add_argument("--densities", type=float, nargs="+", default=DENSITIES)
+    parser.add_argument("--settings", nargs="+", choices=SETTINGS, default=SETTINGS)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-memory", dest="memory", action="store_false")
+    parser.add_argument("--output", help="Path to write JSON results to.")
+    parser.add_argument("--compare", help="Path to JSON results to compare against.")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=1.25,
+        help="Slowdown ratio reported as a regression by --compare.",
+    )
+    args = parser.parse_args(argv)
+
+    results = []
+    for workload in workloads(args.sizes, args.densities, args.settings, args.seed):
+        result = measure(workload, args.repeat, args.memory)
+        results.append(result)
+        if "error" in result:
+            print(f"{workload.name:<48} error: {result['error']}")
+            continue
+        seconds = result["seconds"]
+        stage_times = " ".join(f"{stage}={seconds[stage]:.4f}" for stage in STAGES)
+        memory = f" peak={result['peak_bytes'] / 1e6:.1f}MB" if args.memory else ""
+        print(f"{workload.name:<48} total={seconds['total']:.4f} {stage_times}{memory}")
+
+    if args.output:
+        with open(args.output, "w") as fp:
+            json.dump({"meta": metadata(), "results": results}, fp, indent=2)
+
+    if args.compare:
+        with open(args.compare) as fp:
+            baseline = json.load(fp)["results"]
+        print()
+        return 1 if compare(results, baseline, args.threshold) else 0
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
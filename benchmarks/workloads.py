@@ -0,0 +1,120 @@
+"""
+Synthetic rosters for benchmarking SeatingCharts
+"""
+
+import random
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+Pairs = List[Tuple[str, str]]
+
+SIZES = [10, 100, 1_000, 10_000, 100_000]
+DENSITIES = [0.0, 0.01, 0.1]
+SETTINGS = ["max_size", "num_groups", "both"]
+
+
+class Workload(NamedTuple):
+    name: str
+    size: int
+    together_density: float
+    apart_density: float
+    setting: str
+    kwargs: Dict[str, Any]
+
+
+def roster(size: int) -> List[str]:
+    """Returns `size` distinct, zero-padded names."""
+    width = len(str(size))
+    return [f"p{index:0{width}d}" for index in range(size)]
+
+
+def together_pairs(names: List[str], density: float, rng: random.Random) -> Pairs:
+    """
+    Returns `density` x `len(names)` pairs that chain into clusters of two or
+    three people, so no cluster can outgrow a small `max_size`.
+    """
+    count = int(len(names) * density)
+    starts = rng.sample(range(len(names) // 3), min(count, len(names) // 3))
+    pairs = []
+    for start in starts:
+        first = start * 3
+        pairs.append((names[first], names[first + 1]))
+        if rng.random() < 0.5:
+            pairs.append((names[first + 1], names[first + 2]))
+    return pairs[:count]
+
+
+def apart_pairs(
+    names: List[str], density: float, together: Pairs, rng: random.Random
+) -> Pairs:
+    """
+    Returns `density` x `len(names)` random pairs, skipping any pair that
+    would split a `together` cluster.
+    """
+    position = {item: index for index, item in enumerate(names)}
+    paired = {item for pair in together for item in pair}
+
+    def cluster(item: str) -> Any:
+        return position[item] // 3 if item in paired else item
+
+    count = int(len(names) * density)
+    pairs: Pairs = []
+    seen = set()
+    while len(pairs) < count:
+        item_1, item_2 = rng.sample(names, 2)
+        key = frozenset((item_1, item_2))
+        if key in seen or cluster(item_1) == cluster(item_2):
+            continue
+        seen.add(key)
+        pairs.append((item_1, item_2))
+    return pairs
+
+
+def settings(size: int, setting: str, group_size: int = 8) -> Dict[str, int]:
+    """
+    Returns the `max_size` / `num_groups` arguments for `setting`, sized so
+    that roughly `group_size` people share each group. Small rosters still
+    get a few groups, so random `apart` pairs stay satisfiable.
+    """
+    num_groups = max(size // group_size, 4)
+    if setting == "max_size":
+        return {"max_size": group_size}
+    if setting == "num_groups":
+        return {"num_groups": num_groups}
+    return {"max_size": group_size + 2, "num_groups": num_groups}
+
+
+def workload(
+    size: int,
+    together_density: float = 0.05,
+    apart_density: float = 0.05,
+    setting: str = "max_size",
+    seed: int = 0,
+) -> Workload:
+    """
+    Builds a single synthetic workload. The same arguments always produce the
+    same roster and constraints.
+    """
+    rng = random.Random(seed)
+    names = roster(size)
+    together = together_pairs(names, together_density, rng)
+    apart = apart_pairs(names, apart_density, together, rng)
+    kwargs = dict(roster=names, together=together or None, apart=apart or None)
+    kwargs.update(settings(size, setting))
+    name = f"n={size} together={together_density} apart={apart_density} {setting}"
+    return Workload(name, size, together_density, apart_density, setting, kwargs)
+
+
+def workloads(
+    sizes: Optional[List[int]] = None,
+    densities: Optional[List[float]] = None,
+    setting_names: Optional[List[str]] = None,
+    seed: int = 0,
+) -> Iterator[Workload]:
+    """
+    Yields the full parameter grid, using the same density for `together`
+    and `apart`.
+    """
+    for size in sizes or SIZES:
+        for density in DENSITIES if densities is None else densities:
+            for setting in setting_names or SETTINGS:
+                yield workload(size, density, density, setting, seed)
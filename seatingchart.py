@@ -5,13 +5,57 @@ seatingchart
 > What do you _mean_ we're not sitting together?
 """
 
-import copy
+import argparse
+import asyncio
+import bisect
+import csv
+import hashlib
+import heapq
 import itertools
+import json
+import math
+import os
 import random
-from typing import Optional, List, Tuple, Union, Any
+import sys
+import threading
+import time
+from collections import Counter, OrderedDict, deque
+from concurrent.futures import FIRST_COMPLETED, Executor, Future
+from concurrent.futures import ProcessPoolExecutor, wait
+from contextlib import contextmanager
+from array import array
+from typing import (
+    Optional,
+    Callable,
+    Deque,
+    Dict,
+    FrozenSet,
+    Hashable,
+    IO,
+    Iterator,
+    List,
+    NamedTuple,
+    Sequence,
+    Set,
+    Tuple,
+    Union,
+    Any,
+)
 
 __version__ = "0.1.0"
 
+# Individuals per shard when solving components in a process pool
+_SHARD_SIZE = 5_000
+# Individuals named in `together` and `apart` below which decomposing falls
+# back to the sequential stages, which are faster for smaller inputs
+_POOL_THRESHOLD = 1_000_000
+# Process pools for solving shards, by number of workers
+_POOLS: Dict[int, ProcessPoolExecutor] = {}
+_POOLS_LOCK = threading.Lock()
+
+# Keys of a job read by `seatingchart batch`
+_JOB_KEYS = ("roster", "together", "apart", "max_size", "num_groups", "seed")
+
 # Type declarations
 Roster = Optional[List[str]]
 Pairs = Optional[List[Tuple[str, str]]]
@@ -19,6 +63,22 @@ Number = Optional[int]
 Names = Union[str, List[str]]
 Group = List[str]
 Chart = List[Group]
+Conflicts = Dict[str, Set[str]]
+Memberships = Dict[str, List[FrozenSet[str]]]
+Weights = Dict[Tuple[str, ...], float]
+Score = Callable[[Chart], float]
+Observer = Callable[[str, "Stats"], None]
+CacheKey = Tuple[str, Number, Number, bool, bool, Hashable]
+Source = Union[str, "os.PathLike", IO[str]]
+Records = Iterator[Tuple[int, str, Tuple[str, ...]]]
+
+
+class Move(NamedTuple):
+    """A single individual moved between groups by `SeatingChart.update()`."""
+
+    name: str
+    source: int
+    target: int
 
 
 class PositiveInteger(ValueError):
@@ -29,336 +89,3503 @@ class GroupConflict(ValueError):
     """Raised when there's a collision in incompatible lists."""
 
 
+class DuplicatePair(ValueError):
+    """Raised when the same pair appears twice in `together` or `apart`."""
+
+
 class InvalidRequest(ValueError):
     """Raised when a valid seating chart cannot be made with the provided inputs."""
 
 
-class SeatingChart:
+class Stats:
     """
-    Main class for seating chart logic.
+    Counters collected while generating charts, when a `SeatingChart` is
+    created with `profile=True` or an `observer`. Everything accumulates
+    until `reset()` is called.
+
+    Attributes:
+        timings (Dict[str, float]): Seconds spent in each stage.
+        placements (Dict[str, int]): Individuals seated by each stage.
+        checks (int): Number of `apart` constraint checks.
+        charts (int): Number of charts generated.
+        fallbacks (int): Number of times a chart couldn't be made or patched
+            the usual way, and a slower path was taken instead.
+        retries (int): Number of extra attempts made within a time budget.
+    """
+
+    __slots__ = ("timings", "placements", "checks", "charts", "fallbacks", "retries")
+
+    def __init__(self):
+        self.reset()
+
+    def __repr__(self):
+        timings = ", ".join(f"{k}={v:.4f}s" for k, v in self.timings.items())
+        return (
+            f"{self.__class__.__name__}: {self.charts} Charts, {self.checks} "
+            f"Checks, {self.fallbacks} Fallbacks ({timings})"
+        )
+
+    def reset(self) -> None:
+        """Zeroes every counter."""
+        self.timings: Dict[str, float] = {}
+        self.placements: Dict[str, int] = {}
+        self.checks = 0
+        self.charts = 0
+        self.fallbacks = 0
+        self.retries = 0
+
+    def record(self, stage: str, seconds: float, placements: int) -> None:
+        """Adds a single run of `stage` to the totals."""
+        self.timings[stage] = self.timings.get(stage, 0.0) + seconds
+        self.placements[stage] = self.placements.get(stage, 0) + placements
+
+
+class _Cancelled(Exception):
+    """Raised at a stage boundary when an async call has been cancelled."""
+
+
+class _Call:
+    """
+    Single async call running on a worker thread. The coroutine cancels it,
+    and the worker checks for that at every stage boundary. A chart is only
+    stored while holding `lock`, and only if the call hasn't been cancelled.
+    """
+
+    __slots__ = ("lock", "cancelled", "stored")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.cancelled = False
+        self.stored = False
+
+    def cancel(self) -> bool:
+        """
+        Cancels the call, and returns whether that happened before it stored
+        a chart.
+        """
+        with self.lock:
+            self.cancelled = True
+            return not self.stored
+
+
+# Async call running on the current worker thread, if any
+_CALLS = threading.local()
+
+
+def balance(chart: Chart) -> float:
+    """
+    Scores a seating chart by the variance of its group sizes. Lower scores
+    are better.
+    """
+    if not chart:
+        return 0.0
+    sizes = [len(group) for group in chart]
+    mean = sum(sizes) / len(sizes)
+    return sum((size - mean) ** 2 for size in sizes) / len(sizes)
+
+
+class Mixing:
+    """
+    Scores a seating chart by how little people with the same attribute
+    (e.g. team or school) are mixed: the sum, over groups, of the squared
+    number of members with each attribute value. Lower scores are better.
+
+    Unlike a closure, an instance is picklable, so it can score `best_of()`
+    candidates in a process pool.
+    """
+
+    def __init__(self, attributes: Dict[str, Hashable]):
+        """
+        Args:
+            attributes (Dict[str, Hashable]): Attribute value of each
+                individual. Individuals without one are ignored.
+        """
+        self.attributes = attributes
+
+    def __call__(self, chart: Chart) -> float:
+        attributes = self.attributes
+        return float(
+            sum(
+                count ** 2
+                for group in chart
+                for count in Counter(
+                    attributes[item] for item in group if item in attributes
+                ).values()
+            )
+        )
+
+
+class _DisjointSet:
+    """
+    Union-find over names, with path compression and union by size.
+    """
+
+    def __init__(self):
+        self.__parent: Dict[str, str] = {}
+        self.__size: Dict[str, int] = {}
+        self.__members: Dict[str, List[str]] = {}
+
+    def __contains__(self, item: str) -> bool:
+        return item in self.__parent
+
+    @classmethod
+    def from_pairs(cls, pairs: Pairs) -> "_DisjointSet":
+        """
+        Returns a disjoint-set of `pairs`, or of larger groups. Groups are
+        merged, so a group that bridges two existing sets joins them into a
+        single set.
+        """
+        clusters = cls()
+        for group in pairs or []:
+            for item in group[1:]:
+                clusters.union(group[0], item)
+        return clusters
+
+    def copy(self) -> "_DisjointSet":
+        """
+        Returns an independent copy of the disjoint-set.
+        """
+        clusters = _DisjointSet()
+        clusters.__parent = dict(self.__parent)
+        clusters.__size = dict(self.__size)
+        clusters.__members = {root: list(m) for root, m in self.__members.items()}
+        return clusters
+
+    def add(self, item: str) -> None:
+        """
+        Adds `item` as a singleton set, if it isn't already tracked.
+        """
+        if item not in self.__parent:
+            self.__parent[item] = item
+            self.__size[item] = 1
+            self.__members[item] = [item]
+
+    def find(self, item: str) -> str:
+        """
+        Returns the representative of the set containing `item`.
+        """
+        self.add(item)
+        root = item
+        while self.__parent[root] != root:
+            root = self.__parent[root]
+
+        # Path compression: point every node we walked through at the root.
+        while self.__parent[item] != root:
+            self.__parent[item], item = root, self.__parent[item]
+        return root
+
+    def union(self, item_1: str, item_2: str) -> str:
+        """
+        Merges the sets containing `item_1` and `item_2`, and returns the
+        representative of the merged set.
+        """
+        root_1 = self.find(item_1)
+        root_2 = self.find(item_2)
+        if root_1 == root_2:
+            return root_1
+
+        if self.__size[root_1] < self.__size[root_2]:
+            root_1, root_2 = root_2, root_1
+        self.__parent[root_2] = root_1
+        self.__size[root_1] += self.__size.pop(root_2)
+        self.__members[root_1] += self.__members.pop(root_2)
+        return root_1
+
+    def discard(self, item: str) -> Group:
+        """
+        Removes the whole set containing `item`, and returns its members, so
+        that what's left of it can be merged again.
+        """
+        if item not in self.__parent:
+            return []
+        root = self.find(item)
+        members = self.__members.pop(root)
+        del self.__size[root]
+        for member in members:
+            del self.__parent[member]
+        return members
+
+    def members(self, item: str) -> Group:
+        """
+        Returns every member of the set containing `item`.
+        """
+        if item not in self.__parent:
+            return [item]
+        return self.__members[self.find(item)]
+
+    def largest(self) -> Group:
+        """
+        Returns every member of the largest set, or an empty list if there
+        are no sets.
+        """
+        if not self.__size:
+            return []
+        return self.__members[max(self.__size, key=self.__size.__getitem__)]
+
+    def groups(self) -> Chart:
+        """
+        Returns every set as a list, preserving the order in which members
+        were first seen.
+        """
+        groups: Dict[str, Group] = {}
+        for item in self.__parent:
+            groups.setdefault(self.find(item), []).append(item)
+        return list(groups.values())
+
+
+class _ListIndex:
+    """
+    Index from every entry of a list to its position, so entries can be
+    found and evicted without scanning the list. Evicted entries are
+    replaced by the last entry, like groups in `_ChartBuilder`.
+
+    Entries are names, or pairs and groups keyed by their members. For
+    groups, every name also maps to the keys of the groups it belongs to.
+    """
+
+    def __init__(self, entries: list, grouped: bool):
+        """
+        Args:
+            entries (list): List to index, updated in place.
+            grouped (bool): Whether entries are pairs and groups rather than
+                names.
+        """
+        self.entries = entries
+        self.grouped = grouped
+        self.positions: Dict[Hashable, int] = {}
+        self.keys: Dict[str, Set[FrozenSet[str]]] = {}
+        for entry in entries:
+            self.__track(entry, len(self.positions))
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self.positions
+
+    def key(self, entry: Any) -> Hashable:
+        """
+        Returns the key of `entry`.
+        """
+        return frozenset(entry) if self.grouped else entry
+
+    def keys_of(self, item: str) -> Set[FrozenSet[str]]:
+        """
+        Returns the keys of every group `item` belongs to.
+        """
+        return set(self.keys.get(item, ()))
+
+    def get(self, key: Hashable) -> Any:
+        """
+        Returns the entry stored under `key`.
+        """
+        return self.entries[self.positions[key]]
+
+    def append(self, entry: Any) -> None:
+        """
+        Appends `entry` to the list.
+        """
+        self.entries.append(entry)
+        self.__track(entry, len(self.entries) - 1)
+
+    def replace(self, key: Hashable, entry: Any) -> None:
+        """
+        Replaces the entry stored under `key` with `entry`, in place.
+        """
+        position = self.positions[key]
+        self.__forget(key)
+        self.entries[position] = entry
+        self.__track(entry, position)
+
+    def evict(self, key: Hashable) -> None:
+        """
+        Removes the entry stored under `key`. The last entry takes its
+        position.
+        """
+        position = self.positions[key]
+        self.__forget(key)
+        last = self.entries.pop()
+        if position < len(self.entries):
+            self.entries[position] = last
+            self.positions[self.key(last)] = position
+
+    def __track(self, entry: Any, position: int) -> None:
+        """
+        Records that `entry` sits at `position`.
+        """
+        key = self.key(entry)
+        self.positions[key] = position
+        if self.grouped:
+            for item in key:
+                self.keys.setdefault(item, set()).add(key)
+
+    def __forget(self, key: Hashable) -> None:
+        """
+        Forgets the entry stored under `key`.
+        """
+        del self.positions[key]
+        if self.grouped:
+            for item in key:
+                self.keys[item].discard(key)
+
+
+class _ChartBuilder:
+    """
+    Seating chart under construction, with an index from every placed name
+    to the position of its group.
+
+    Group sizes are tracked in a min-heap and a max-heap of `(size, index)`
+    entries. Entries are pushed whenever a group changes size, and stale
+    entries are discarded lazily when they reach the top. Once `by_size()`
+    is first called, groups are also kept in buckets by size.
+
+    Each group also counts, per name, how many of its members must be kept
+    apart from that name, so people can be evicted as well as placed. `apart`
+    groups of three or more are counted as a single frozenset key instead,
+    so seating someone costs one step per group rather than per member.
+
+    `append()` also keeps the sorted indexes of the groups with room for its
+    `max_size`, so full groups are skipped without being visited. Groups that
+    gain room are added as they change size, and groups that fill up or are
+    dropped are discarded lazily when `append()` reaches them. Likewise, for
+    each `apart` group of three or more, it keeps a cursor below which every
+    group already holds a member, so seating a group of `k` members doesn't
+    try each member against every earlier one.
+
+    If `journal` is a list, every change to the groups is recorded in it, so
+    that `rollback()` can undo them.
     """
 
     def __init__(
         self,
-        roster: Roster = None,
-        together: Pairs = None,
-        apart: Pairs = None,
-        max_size: Number = None,
-        num_groups: Number = None,
+        chart: Chart = None,
+        conflicts: Conflicts = None,
+        memberships: Optional[Memberships] = None,
     ):
         """
         Args:
-            roster (Roster): List of individuals included in the chart.
-                Defaults to `None`.
-            together (Pairs): List of pairs of individuals who should
-                explicitly be grouped together. Defaults to `None`.
-            apart (Pairs): List of pairs of individuals who should
-                explicitly be separated. Defaults to `None`.
-            max_size (Number): Maximum size of a single group. Defaults to
-                unlimited (`None`).
-            num_groups (Number): Maximum number of groups. Defaults to
-                unlimited (`None`).
+            chart (Chart): Groups to seed the builder with. Defaults to
+                `None`.
+            conflicts (Conflicts): Mapping of each name to the names it must
+                be kept apart from. Defaults to `None`.
+            memberships (Memberships): Mapping of each name to the `apart`
+                groups of three or more it belongs to. Defaults to `None`.
         """
-        self.together, self.apart = self.__validate_together_apart(together, apart)
-        self.max_size = self.__validate_integer_inputs(max_size)
-        self.num_groups = self.__validate_integer_inputs(num_groups)
+        self.groups: Chart = []
+        self.locations: Dict[str, int] = {}
+        self.conflicts: Conflicts = conflicts if conflicts is not None else {}
+        self.memberships: Memberships = memberships if memberships is not None else {}
+        self.group_conflicts: List[Dict[Hashable, int]] = []
+        self.origins: Optional[Dict[str, Group]] = None
+        self.journal: Optional[List[Tuple[Any, ...]]] = None
+        self.checks = 0
+        self.__open: List[int] = []
+        self.__capacity: Number = None
+        self.__cursors: Dict[Hashable, int] = {}
+        self.__buckets: Optional[Dict[int, Set[int]]] = None
+        self.__sizes: Dict[int, int] = {}
+        self.__smallest: List[Tuple[int, int]] = []
+        self.__largest: List[Tuple[int, int]] = []
 
-        # Roster validation must occur after we have validated `together` and
-        # `apart`.
-        self.roster = self.__validate_roster(roster)
+        for group in chart or []:
+            self.add_group(group)
 
-        self.__chart = None
+    def __contains__(self, item: str) -> bool:
+        return item in self.locations
 
-    # +--------------------+
-    # | Data model methods |
-    # +--------------------+
+    def __len__(self) -> int:
+        return len(self.groups)
 
-    def __repr__(self):
-        return f"{self.__class__.__name__}: {len(self.roster)} Individuals, {len(self.chart)} Groups"
+    def group_of(self, item: str) -> Number:
+        """
+        Returns the index of the group containing `item`, or `None` if it
+        hasn't been placed.
+        """
+        return self.locations.get(item)
 
-    def __len__(self):
-        return len(self.chart)
+    def add_group(self, items: Group) -> int:
+        """
+        Places `items` in a new group, and returns the index of that group.
+        """
+        index = len(self.groups)
+        self.groups.append([])
+        self.group_conflicts.append({})
+        self.__track(index)
+        if self.journal is not None:
+            self.journal.append(("add_group",))
+        for item in items:
+            self.place(item, index)
+        return index
 
-    def __eq__(self, other):
-        return self.chart == other.chart
+    def place(self, item: str, index: int) -> None:
+        """
+        Places `item` in the group at `index`.
+        """
+        if item in self.locations:
+            raise ValueError(f"Value '{item}' occurrs in more than one list.")
+        self.groups[index].append(item)
+        self.locations[item] = index
+        for conflict_item in self.conflicts.get(item, ()):
+            self.__count_conflict(index, conflict_item, 1)
+        for group in self.memberships.get(item, ()):
+            self.__count_conflict(index, group, 1)
+        self.__track(index)
+        if self.journal is not None:
+            self.journal.append(("place", item))
 
-    # +----------------+
-    # | Public methods |
-    # +----------------+
+    def evict(self, item: str) -> None:
+        """
+        Removes `item` from its group. Groups left empty are dropped, and the
+        last group takes their index.
+        """
+        index = self.__detach(item)
+        if not self.groups[index]:
+            self.__drop_group(index)
 
-    @property
-    def chart(self) -> Chart:
+    def append(self, item: str, max_size: Number = None) -> int:
         """
-        Returns generated seating chart, and creates it if it doesn't already
-            exist.
+        Places `item` in the first group with room for it and nobody it must
+        be kept apart from, or in a new group, and returns the index of that
+        group.
+        """
+        start = 0
+        for group in self.memberships.get(item, ()):
+            start = max(start, self.__advance(group))
 
-        Returns:
-            Chart: Seating chart.
+        candidates: Sequence[int]
+        if max_size is None:
+            candidates = range(start, len(self.groups))
+        else:
+            if self.__capacity != max_size:
+                self.__capacity = max_size
+                self.__open = [
+                    index
+                    for index, group in enumerate(self.groups)
+                    if len(group) < max_size
+                ]
+            candidates = self.__open
+
+        position = bisect.bisect_left(candidates, start)
+        while position < len(candidates):
+            index = candidates[position]
+            if max_size is not None and (
+                index >= len(self.groups) or len(self.groups[index]) >= max_size
+            ):
+                del self.__open[position]
+                continue
+            # Item we're appending may have an "apart" constraint. Verify
+            # that the group we're trying to add "item" to doesn't cause
+            # conflict.
+            if self.can_place(item, index):
+                self.place(item, index)
+                return index
+            position += 1
+
+        return self.add_group([item])
+
+    def __advance(self, group: FrozenSet[str]) -> int:
         """
-        if self.__chart is None:
-            self.__chart = self.__generate_chart()
-        return self.__chart
+        Moves the cursor of the `apart` group `group` past every group that
+        already holds one of its members, and returns it.
+        """
+        cursor = self.__cursors.get(group, 0)
+        while cursor < len(self.groups) and group in self.group_conflicts[cursor]:
+            cursor += 1
+        self.__cursors[group] = cursor
+        return cursor
 
-    def new(self) -> Chart:
+    def move(self, item: str, index: int) -> int:
         """
-        Returns a new seating chart, even if one already exists.
+        Moves `item` into the group at `index`, and returns the index of that
+        group afterwards (it changes if the group `item` left is dropped).
 
-        Returns:
-            Chart: Seating chart.
+        If `origins` is a dict, the first group each moved item left is
+        recorded in it.
         """
-        self.__chart = self.__generate_chart()
-        return self.__chart
+        if self.origins is not None and item not in self.origins:
+            self.origins[item] = self.groups[self.locations[item]]
+        source = self.__detach(item)
+        self.place(item, index)
+        if not self.groups[source]:
+            last = len(self.groups) - 1
+            self.__drop_group(source)
+            if index == last:
+                index = source
+        return index
 
-    def add(
-        self, name: Names = None, together: Pairs = None, apart: Pairs = None
-    ) -> None:
-        raise NotImplementedError
+    def swap(self, item_1: str, item_2: str) -> None:
+        """
+        Swaps the groups of `item_1` and `item_2`.
+        """
+        index_1 = self.__detach(item_1)
+        index_2 = self.__detach(item_2)
+        self.place(item_1, index_2)
+        self.place(item_2, index_1)
+
+    def link(self, item_1: str, item_2: str) -> None:
+        """
+        Records that `item_1` and `item_2` must be kept apart.
+        """
+        for item, conflict_item in ((item_1, item_2), (item_2, item_1)):
+            conflicts = self.conflicts.setdefault(item, set())
+            if conflict_item in conflicts:
+                continue
+            conflicts.add(conflict_item)
+            if item in self.locations:
+                self.__count_conflict(self.locations[item], conflict_item, 1)
+
+    def unlink(self, item_1: str, item_2: str) -> None:
+        """
+        Forgets that `item_1` and `item_2` must be kept apart.
+        """
+        for item, conflict_item in ((item_1, item_2), (item_2, item_1)):
+            conflicts = self.conflicts.get(item, set())
+            if conflict_item not in conflicts:
+                continue
+            conflicts.discard(conflict_item)
+            if item in self.locations:
+                self.__count_conflict(self.locations[item], conflict_item, -1)
+
+    def join(self, group: FrozenSet[str]) -> None:
+        """
+        Records that every member of `group` must be kept apart from the
+        others.
+        """
+        for item in group:
+            self.memberships.setdefault(item, []).append(group)
+            if item in self.locations:
+                self.__count_conflict(self.locations[item], group, 1)
+
+    def part(self, group: FrozenSet[str]) -> None:
+        """
+        Forgets that the members of `group` must be kept apart.
+        """
+        for item in group:
+            groups = self.memberships.get(item, [])
+            if group not in groups:
+                continue
+            groups.remove(group)
+            if item in self.locations:
+                self.__count_conflict(self.locations[item], group, -1)
+
+    def __detach(self, item: str) -> int:
+        """
+        Removes `item` from its group without dropping the group, and returns
+        the index of that group.
+        """
+        index = self.locations.pop(item)
+        position = self.groups[index].index(item)
+        del self.groups[index][position]
+        for conflict_item in self.conflicts.get(item, ()):
+            self.__count_conflict(index, conflict_item, -1)
+        for group in self.memberships.get(item, ()):
+            self.__count_conflict(index, group, -1)
+        self.__track(index)
+        if self.journal is not None:
+            self.journal.append(("detach", item, index, position))
+        return index
+
+    def __drop_group(self, index: int) -> None:
+        """
+        Drops the empty group at `index` by moving the last group into it.
+        """
+        last = len(self.groups) - 1
+        if index != last:
+            self.__exchange(index, last)
+        self.groups.pop()
+        self.group_conflicts.pop()
+        if self.journal is not None:
+            self.journal.append(("drop_group", index))
+
+    def __exchange(self, index_1: int, index_2: int) -> None:
+        """
+        Exchanges the positions of the groups at `index_1` and `index_2`.
+        """
+        groups, counts = self.groups, self.group_conflicts
+        groups[index_1], groups[index_2] = groups[index_2], groups[index_1]
+        counts[index_1], counts[index_2] = counts[index_2], counts[index_1]
+        for index in (index_1, index_2):
+            for item in groups[index]:
+                self.locations[item] = index
+            self.__track(index)
+        # A group that held members may have left a lower index.
+        lower = min(index_1, index_2)
+        for group in itertools.chain(counts[index_1], counts[index_2]):
+            if self.__cursors.get(group, 0) > lower:
+                self.__cursors[group] = lower
+
+    def rollback(self) -> None:
+        """
+        Undoes every change recorded in `journal`, in reverse order, and stops
+        recording.
+        """
+        journal, self.journal = self.journal or [], None
+        for change in reversed(journal):
+            if change[0] == "add_group":
+                self.groups.pop()
+                self.group_conflicts.pop()
+            elif change[0] == "place":
+                self.__detach(change[1])
+            elif change[0] == "detach":
+                _, item, index, position = change
+                self.place(item, index)
+                self.groups[index].insert(position, self.groups[index].pop())
+            else:
+                index = change[1]
+                self.groups.append([])
+                self.group_conflicts.append({})
+                self.__track(len(self.groups) - 1)
+                if index != len(self.groups) - 1:
+                    self.__exchange(index, len(self.groups) - 1)
+
+    def __count_conflict(self, index: int, item: Hashable, change: int) -> None:
+        """
+        Adjusts how many members of the group at `index` conflict with
+        `item`, or belong to the `apart` group `item`.
+        """
+        counts = self.group_conflicts[index]
+        count = counts.get(item, 0) + change
+        if count:
+            counts[item] = count
+        else:
+            del counts[item]
+            if self.__cursors.get(item, 0) > index:
+                self.__cursors[item] = index
+
+    def smallest(self) -> Tuple[int, int]:
+        """
+        Returns the size and index of the smallest group. Ties go to the
+        group with the lowest index.
+        """
+        heap = self.__smallest
+        while not self.__is_current(heap[0][0], heap[0][1]):
+            heapq.heappop(heap)
+        return heap[0]
+
+    def largest(self) -> int:
+        """
+        Returns the size of the largest group.
+        """
+        heap = self.__largest
+        while not self.__is_current(-heap[0][0], heap[0][1]):
+            heapq.heappop(heap)
+        return -heap[0][0]
+
+    def by_size(self, limit: Number = None) -> Iterator[int]:
+        """
+        Yields the indexes of the groups with at most `limit` members, from
+        smallest to largest. The builder mustn't change during iteration.
+        """
+        if self.__buckets is None:
+            self.__buckets = {}
+            for index in range(len(self.groups)):
+                self.__bucket(index)
+        for size in sorted(self.__buckets):
+            if limit is not None and size > limit:
+                return
+            for index in self.__buckets[size]:
+                # Indexes of dropped groups are left behind.
+                if index < len(self.groups):
+                    yield index
+
+    def __bucket(self, index: int) -> None:
+        """
+        Moves the group at `index` into the bucket of its current size.
+        """
+        size = len(self.groups[index])
+        previous = self.__sizes.get(index)
+        if previous == size:
+            return
+        if previous is not None:
+            bucket = self.__buckets[previous]
+            bucket.discard(index)
+            if not bucket:
+                del self.__buckets[previous]
+        self.__buckets.setdefault(size, set()).add(index)
+        self.__sizes[index] = size
+
+    def __is_current(self, size: int, index: int) -> bool:
+        """
+        Returns whether a heap entry still matches the group at `index`.
+        """
+        return index < len(self.groups) and len(self.groups[index]) == size
+
+    def __track(self, index: int) -> None:
+        """
+        Records the current size of the group at `index` in both heaps, in
+        its bucket, and in the open groups of `append()` if it has room.
+        """
+        size = len(self.groups[index])
+        heapq.heappush(self.__smallest, (size, index))
+        heapq.heappush(self.__largest, (-size, index))
+        if self.__buckets is not None:
+            self.__bucket(index)
+        if self.__capacity is not None and size < self.__capacity:
+            position = bisect.bisect_left(self.__open, index)
+            if position == len(self.__open) or self.__open[position] != index:
+                self.__open.insert(position, index)
+
+    def snapshot(self) -> Chart:
+        """
+        Returns a copy of the groups that is detached from the builder.
+        """
+        return [list(group) for group in self.groups]
+
+    def copy(self) -> "_ChartBuilder":
+        """
+        Returns an independent copy of the builder. The `conflicts` and
+        `memberships` mappings are shared, since they aren't changed by
+        placing people.
+        """
+        builder = _ChartBuilder(conflicts=self.conflicts, memberships=self.memberships)
+        builder.groups = self.snapshot()
+        builder.locations = dict(self.locations)
+        builder.group_conflicts = [dict(counts) for counts in self.group_conflicts]
+        builder.__smallest = list(self.__smallest)
+        builder.__largest = list(self.__largest)
+        builder.__cursors = dict(self.__cursors)
+        return builder
+
+    def can_place(self, item: str, index: int) -> bool:
+        """
+        Returns whether `item` can join the group at `index` without sitting
+        with anyone it must be kept apart from.
+        """
+        self.checks += 1
+        counts = self.group_conflicts[index]
+        if item in counts:
+            return False
+        # `item`'s own membership is counted if it already sits there.
+        own = 1 if self.locations.get(item) == index else 0
+        return not any(
+            counts.get(group, 0) > own for group in self.memberships.get(item, ())
+        )
+
+
+class _PackedChart:
+    """
+    Seating chart stored as interned integer ids, CSR-style: the members of
+    group `g` are `members[offsets[g]:offsets[g + 1]]`. Names are only
+    materialised when groups are read.
+    """
+
+    __slots__ = ("names", "ids", "members", "offsets", "locations")
+
+    def __init__(self, groups: Chart, names: List[str], ids: Dict[str, int]):
+        """
+        Args:
+            groups (Chart): Seating chart to pack.
+            names (List[str]): Interned names, indexed by id.
+            ids (Dict[str, int]): Mapping of each name to its id.
+        """
+        self.names = names
+        self.ids = ids
+        self.members = array("i")
+        self.offsets = array("i", [0])
+        self.locations = array("i", [-1]) * len(names)
+
+        for index, group in enumerate(groups):
+            for item in group:
+                item_id = ids[item]
+                self.members.append(item_id)
+                self.locations[item_id] = index
+            self.offsets.append(len(self.members))
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __iter__(self) -> Iterator[Group]:
+        for index in range(len(self)):
+            yield self.group(index)
+
+    def group(self, index: int) -> Group:
+        """
+        Returns the names in the group at `index`.
+        """
+        start, stop = self.offsets[index], self.offsets[index + 1]
+        return [self.names[item_id] for item_id in self.members[start:stop]]
+
+    def group_of(self, item: str) -> Number:
+        """
+        Returns the index of the group containing `item`, or `None` if it
+        hasn't been placed.
+        """
+        item_id = self.ids.get(item)
+        if item_id is None or self.locations[item_id] < 0:
+            return
+        return self.locations[item_id]
+
+    def unpack(self) -> Chart:
+        """
+        Returns the seating chart as nested lists of names.
+        """
+        return list(self)
+
+
+class Objective:
+    """
+    Base class for objectives minimised by `SeatingChart.optimize()`.
+
+    The chart is scored once by `reset()`, after which single moves and
+    swaps are priced incrementally. Methods receive the chart under
+    construction, whose `groups` attribute is the list of groups and whose
+    `locations` attribute maps each name to the index of its group.
+    """
+
+    def reset(self, builder: "_ChartBuilder") -> float:
+        """
+        Prepares any running totals for `builder`, and returns its score.
+        """
+        raise NotImplementedError
+
+    def move_delta(self, builder: "_ChartBuilder", item: str, target: int) -> float:
+        """
+        Returns the change in score if `item` moved to the group at `target`.
+        """
+        raise NotImplementedError
+
+    def swap_delta(self, builder: "_ChartBuilder", item_1: str, item_2: str) -> float:
+        """
+        Returns the change in score if `item_1` and `item_2` swapped groups.
+        """
+        raise NotImplementedError
+
+    def moved(
+        self, builder: "_ChartBuilder", item: str, source: int, target: int
+    ) -> None:
+        """
+        Updates any running totals after `item` moved from `source` to
+        `target`.
+        """
+
+
+class SizeVariance(Objective):
+    """
+    Penalises uneven group sizes. The score is the sum of squared group
+    sizes, which for a fixed roster and number of groups differs from the
+    variance only by constants.
+    """
+
+    def reset(self, builder: "_ChartBuilder") -> float:
+        return float(sum(len(group) ** 2 for group in builder.groups))
+
+    def move_delta(self, builder: "_ChartBuilder", item: str, target: int) -> float:
+        source = builder.locations[item]
+        return 2.0 * (len(builder.groups[target]) - len(builder.groups[source]) + 1)
+
+    def swap_delta(self, builder: "_ChartBuilder", item_1: str, item_2: str) -> float:
+        return 0.0
+
+
+class Diversity(Objective):
+    """
+    Penalises seating people who share an attribute (e.g. team or school)
+    together. The score is the sum, over groups, of the squared number of
+    members with each attribute value.
+    """
+
+    def __init__(self, attributes: Dict[str, Hashable]):
+        """
+        Args:
+            attributes (Dict[str, Hashable]): Attribute value of each
+                individual. Individuals without one are ignored.
+        """
+        self.attributes = attributes
+        self.__counts: List[Counter] = []
+
+    def reset(self, builder: "_ChartBuilder") -> float:
+        self.__counts = [
+            Counter(self.attributes[item] for item in group if item in self.attributes)
+            for group in builder.groups
+        ]
+        return float(
+            sum(count ** 2 for counts in self.__counts for count in counts.values())
+        )
+
+    def move_delta(self, builder: "_ChartBuilder", item: str, target: int) -> float:
+        if item not in self.attributes:
+            return 0.0
+        value = self.attributes[item]
+        source = builder.locations[item]
+        return 2.0 * (self.__counts[target][value] - self.__counts[source][value] + 1)
+
+    def swap_delta(self, builder: "_ChartBuilder", item_1: str, item_2: str) -> float:
+        if self.attributes.get(item_1) == self.attributes.get(item_2):
+            return 0.0
+        return self.move_delta(
+            builder, item_1, builder.locations[item_2]
+        ) + self.move_delta(builder, item_2, builder.locations[item_1])
+
+    def moved(
+        self, builder: "_ChartBuilder", item: str, source: int, target: int
+    ) -> None:
+        if item in self.attributes:
+            value = self.attributes[item]
+            self.__counts[source][value] -= 1
+            self.__counts[target][value] += 1
+
+
+class Preferences(Objective):
+    """
+    Rewards seating pairs or larger groups with a positive weight together,
+    and penalises seating those with a negative weight together. These are
+    soft preferences: unlike `together` and `apart`, they may be broken. The
+    score is minus the weight of each group, for every pair of its members
+    seated together.
+
+    Groups aren't expanded into pairs. Each chart group counts how many
+    members of every preference it holds, so pricing a move costs one step
+    per preference of the individual moved, whatever their size.
+    """
+
+    def __init__(self, weights: Weights):
+        """
+        Args:
+            weights (Weights): Weight of each pair or larger group.
+        """
+        self.weights = dict(weights)
+        self.__groups: Dict[str, List[Tuple[int, float]]] = {}
+        for key, (group, weight) in enumerate(self.weights.items()):
+            for item in dict.fromkeys(group):
+                self.__groups.setdefault(item, []).append((key, weight))
+        self.__counts: List[Counter] = []
+
+    def reset(self, builder: "_ChartBuilder") -> float:
+        self.__counts = [
+            Counter(key for item in group for key, _ in self.__groups.get(item, ()))
+            for group in builder.groups
+        ]
+        weights = list(self.weights.values())
+        return -sum(
+            weights[key] * count * (count - 1) / 2
+            for counts in self.__counts
+            for key, count in counts.items()
+        )
+
+    def move_delta(self, builder: "_ChartBuilder", item: str, target: int) -> float:
+        source = self.__counts[builder.locations[item]]
+        delta = 0.0
+        for key, weight in self.__groups.get(item, ()):
+            delta += weight * (source[key] - 1 - self.__counts[target][key])
+        return delta
+
+    def swap_delta(self, builder: "_ChartBuilder", item_1: str, item_2: str) -> float:
+        delta = self.move_delta(
+            builder, item_1, builder.locations[item_2]
+        ) + self.move_delta(builder, item_2, builder.locations[item_1])
+        # Each move counted the other individual as a new neighbour, but they
+        # still sit apart after the swap.
+        shared = {key for key, _ in self.__groups.get(item_2, ())}
+        for key, weight in self.__groups.get(item_1, ()):
+            if key in shared:
+                delta += 2 * weight
+        return delta
+
+    def moved(
+        self, builder: "_ChartBuilder", item: str, source: int, target: int
+    ) -> None:
+        for key, _ in self.__groups.get(item, ()):
+            self.__counts[source][key] -= 1
+            self.__counts[target][key] += 1
+
+
+class Repeats(Objective):
+    """
+    Penalises seating people together who have already sat together, for
+    events with several rounds. The score is the number of earlier meetings
+    between every pair seated together.
+
+    Meetings are kept in a sparse, symmetric matrix over interned integer
+    ids. While scoring a chart, each group also keeps how often every
+    individual has met its members, so pricing a move is a lookup, and
+    updating it after a move costs one step per person the individual has
+    met.
+    """
+
+    def __init__(self):
+        self.ids: Dict[str, int] = {}
+        self.counts: Dict[int, Dict[int, int]] = {}
+        self.__met: List[Dict[int, int]] = []
+
+    def record(self, chart: Chart) -> None:
+        """
+        Counts a meeting between every pair seated together in `chart`.
+        """
+        for group in chart:
+            group_ids = [self.ids.setdefault(item, len(self.ids)) for item in group]
+            for item_id in group_ids:
+                row = self.counts.setdefault(item_id, {})
+                for other_id in group_ids:
+                    if other_id != item_id:
+                        row[other_id] = row.get(other_id, 0) + 1
+
+    def meetings(self, item_1: str, item_2: str) -> int:
+        """
+        Returns how many times `item_1` and `item_2` have sat together.
+        """
+        id_1, id_2 = self.ids.get(item_1), self.ids.get(item_2)
+        return self.counts.get(id_1, {}).get(id_2, 0)
+
+    def reset(self, builder: "_ChartBuilder") -> float:
+        self.__met = [{} for _ in builder.groups]
+        score = 0
+        for index, group in enumerate(builder.groups):
+            met = self.__met[index]
+            for item in group:
+                for other_id, count in self.__row(item).items():
+                    met[other_id] = met.get(other_id, 0) + count
+            score += sum(met.get(self.ids.get(item), 0) for item in group)
+        return score / 2
+
+    def move_delta(self, builder: "_ChartBuilder", item: str, target: int) -> float:
+        item_id = self.ids.get(item)
+        source = builder.locations[item]
+        return self.__met[target].get(item_id, 0) - self.__met[source].get(item_id, 0)
+
+    def swap_delta(self, builder: "_ChartBuilder", item_1: str, item_2: str) -> float:
+        delta = self.move_delta(
+            builder, item_1, builder.locations[item_2]
+        ) + self.move_delta(builder, item_2, builder.locations[item_1])
+        # Each move counted the other individual as a neighbour, but they
+        # still sit apart after the swap.
+        return delta - 2 * self.meetings(item_1, item_2)
+
+    def moved(
+        self, builder: "_ChartBuilder", item: str, source: int, target: int
+    ) -> None:
+        source_met, target_met = self.__met[source], self.__met[target]
+        for other_id, count in self.__row(item).items():
+            source_met[other_id] -= count
+            target_met[other_id] = target_met.get(other_id, 0) + count
+
+    def __row(self, item: str) -> Dict[int, int]:
+        """
+        Returns how many times `item` has met everyone else, by id.
+        """
+        item_id = self.ids.get(item)
+        return self.counts.get(item_id, {}) if item_id is not None else {}
+
+
+class _ExactSolver:
+    """
+    Exact solver that colours units (`together` clusters) into a fixed
+    number of groups, so that no group holds two units that must be kept
+    apart or exceeds its capacity.
+
+    Units are chosen in DSATUR order: the most constrained unit (most
+    distinct groups among its coloured neighbours) goes first. After each
+    choice the neighbours' domains are narrowed, and the search backtracks as
+    soon as one of them is left without a group. Conflict sets and domains
+    are integer bitsets over unit and group indices.
+    """
+
+    def __init__(
+        self,
+        weights: List[int],
+        adjacency: List[int],
+        num_groups: int,
+        capacity: Number = None,
+        limit: Number = 100_000,
+    ):
+        """
+        Args:
+            weights (List[int]): Size of each unit.
+            adjacency (List[int]): Bitset of the units each unit conflicts
+                with.
+            num_groups (int): Number of groups available.
+            capacity (Number): Maximum size of a group. Defaults to
+                unlimited (`None`).
+            limit (Number): Maximum number of assignments to try before
+                giving up, or `None` for no limit. Defaults to 100,000.
+        """
+        self.weights = weights
+        self.adjacency = adjacency
+        self.num_groups = num_groups
+        self.capacity = capacity
+        self.limit = limit
+        self.reached_limit = False
+
+        self.__neighbors = [self.__bits(mask) for mask in adjacency]
+        self.__degrees = [len(neighbors) for neighbors in self.__neighbors]
+        self.__colors = [-1] * len(weights)
+        self.__loads = [0] * num_groups
+        self.__forbidden = [0] * len(weights)
+
+    def solve(self) -> Optional[List[int]]:
+        """
+        Returns the group of every unit, or `None` if no assignment exists or
+        the search limit was reached, in which case `reached_limit` is set.
+        """
+        unit = self.__select()
+        if unit is None:
+            return self.__colors
+        if not self.__options(unit):
+            return
+
+        # Each frame holds a unit, its candidate groups, the position of the
+        # next candidate and the changes made by the current assignment.
+        frames = [[unit, self.__options(unit), 0, None]]
+        tried = 0
+        while frames:
+            frame = frames[-1]
+            unit, options, position, changes = frame
+            if changes is not None:
+                self.__unassign(unit, changes)
+                frame[3] = None
+            if position == len(options):
+                frames.pop()
+                continue
+
+            frame[2] += 1
+            tried += 1
+            if self.limit is not None and tried > self.limit:
+                self.reached_limit = True
+                return
+
+            changes = self.__assign(unit, options[position])
+            if changes is None:
+                continue
+            frame[3] = changes
+
+            unit = self.__select()
+            if unit is None:
+                return list(self.__colors)
+            frames.append([unit, self.__options(unit), 0, None])
+        return
+
+    def __select(self) -> Number:
+        """
+        Returns the uncoloured unit with the highest saturation, breaking
+        ties by degree and then weight, or `None` if every unit is coloured.
+        """
+        best, best_key = None, None
+        for unit, color in enumerate(self.__colors):
+            if color != -1:
+                continue
+            key = (
+                bin(self.__forbidden[unit]).count("1"),
+                self.__degrees[unit],
+                self.weights[unit],
+            )
+            if best_key is None or key > best_key:
+                best, best_key = unit, key
+        return best
+
+    def __options(self, unit: int) -> List[int]:
+        """
+        Returns the groups `unit` can join. Only the first empty group is
+        offered, since empty groups are interchangeable.
+        """
+        options = []
+        offered_empty = False
+        for group, load in enumerate(self.__loads):
+            if self.__forbidden[unit] >> group & 1:
+                continue
+            if self.capacity is not None and load + self.weights[unit] > self.capacity:
+                continue
+            if load == 0:
+                if offered_empty:
+                    continue
+                offered_empty = True
+            options.append(group)
+        return options
+
+    def __assign(self, unit: int, group: int) -> Optional[List[Tuple[int, int]]]:
+        """
+        Puts `unit` in `group` and narrows its neighbours' domains. Returns
+        the changes made, or `None` (with nothing changed) if a neighbour is
+        left without a group.
+        """
+        self.__colors[unit] = group
+        self.__loads[group] += self.weights[unit]
+
+        changes = []
+        for neighbor in self.__neighbors[unit]:
+            forbidden = self.__forbidden[neighbor]
+            if self.__colors[neighbor] != -1 or forbidden >> group & 1:
+                continue
+            changes.append((neighbor, forbidden))
+            self.__forbidden[neighbor] = forbidden | 1 << group
+
+        for neighbor, _ in changes:
+            if not self.__options(neighbor):
+                self.__unassign(unit, changes)
+                return
+        return changes
+
+    def __unassign(self, unit: int, changes: List[Tuple[int, int]]) -> None:
+        """
+        Reverts `__assign()`.
+        """
+        for neighbor, forbidden in changes:
+            self.__forbidden[neighbor] = forbidden
+        self.__loads[self.__colors[unit]] -= self.weights[unit]
+        self.__colors[unit] = -1
+
+    @staticmethod
+    def __bits(mask: int) -> List[int]:
+        """
+        Returns the indices of the set bits in `mask`.
+        """
+        bits = []
+        while mask:
+            low = mask & -mask
+            bits.append(low.bit_length() - 1)
+            mask ^= low
+        return bits
+
+
+class ConstraintSet:
+    """
+    `roster`, `together` and `apart`, validated once and compiled into the
+    frozen form that chart generation works from: clusters of people who sit
+    together, the adjacency of pairs kept apart, the larger groups kept
+    apart, and interned ids. Any number of `SeatingChart`s can share a single
+    ConstraintSet.
+
+    `together` and `apart` take pairs, or larger groups, which are handled
+    as a whole instead of being expanded into every pair of their members.
+
+    ConstraintSets are hashable. Two ConstraintSets with the same people and
+    pairs, in any order, are equal and have the same `digest`, which is
+    stable across processes.
+    """
+
+    __slots__ = (
+        "roster",
+        "together",
+        "apart",
+        "names",
+        "ids",
+        "conflicts",
+        "memberships",
+        "clusters",
+        "digest",
+    )
+
+    def __init__(
+        self, roster: Roster = None, together: Pairs = None, apart: Pairs = None
+    ):
+        """
+        Args:
+            roster (Roster): List of individuals included in the chart.
+                Defaults to `None`.
+            together (Pairs): List of pairs, or larger groups, of
+                individuals who should explicitly be grouped together.
+                Defaults to `None`.
+            apart (Pairs): List of pairs, or larger groups, of individuals
+                who should explicitly be separated from each other. Defaults
+                to `None`.
+        """
+        self.together, self.apart = self.__validate_together_apart(together, apart)
+
+        # Roster validation must occur after we have validated `together` and
+        # `apart`.
+        self.roster = self.__validate_roster(roster)
+
+        self.names: List[str] = list(dict.fromkeys(self.roster or []))
+        self.ids = {name: index for index, name in enumerate(self.names)}
+        self.conflicts, self.memberships = self.__compile_apart()
+        self.clusters = _DisjointSet.from_pairs(self.together)
+        self.__validate_clusters()
+        self.digest = self.__digest()
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}: {len(self.names)} Individuals, {self.digest[:12]}"
+
+    def __eq__(self, other):
+        if not isinstance(other, ConstraintSet):
+            return NotImplemented
+        return self.digest == other.digest
+
+    def __hash__(self):
+        return hash(self.digest)
+
+    def __freeze(self, item: Any) -> Any:
+        """
+        Returns a roster or a list of pairs as tuples, or `None`.
+        """
+        if item is None:
+            return
+        return tuple(i if isinstance(i, str) else tuple(i) for i in item)
+
+    def __validate_together_apart(
+        self, together: Pairs, apart: Pairs
+    ) -> Tuple[Pairs, Pairs]:
+        """
+        Ensures there are no duplicate pairs or groups in `together` or
+        `apart`, and no collisions between them. Groups are compared as
+        unordered keys, so this is a single linear pass.
+        """
+        together = self.__freeze(together)
+        apart = self.__freeze(apart)
+
+        _ = self.__pair_keys(together, "together")
+        apart_keys = self.__pair_keys(apart, "apart")
+
+        for pair in together or ():
+            if frozenset(pair) in apart_keys:
+                raise GroupConflict(
+                    f"Collision in `apart` and `together`: {list(pair)}."
+                )
+
+        return together, apart
+
+    def __pair_keys(self, pairs: Pairs, argument: str) -> Set[FrozenSet[str]]:
+        """
+        Returns every pair or group in `pairs` as an unordered key, and
+        ensures that each names at least two different individuals, and that
+        none appears twice, e.g. as both `(a, b)` and `(b, a)`.
+        """
+        keys: Set[FrozenSet[str]] = set()
+        for pair in pairs or ():
+            key = _group_key(pair, argument)
+            if key in keys:
+                kind = "pair" if len(pair) == 2 else "group"
+                raise DuplicatePair(f"Duplicate {kind} in `{argument}`: {list(pair)}.")
+            keys.add(key)
+        return keys
+
+    def __validate_clusters(self) -> None:
+        """
+        Ensures that no two members of an `apart` pair or group end up in the
+        same `together` cluster, e.g. `apart` on `(a, c)` with `together` on
+        `(a, b)` and `(b, c)`.
+        """
+        for group in self.apart or ():
+            roots: Dict[str, str] = {}
+            for item in group:
+                if item not in self.clusters:
+                    continue
+                other = roots.setdefault(self.clusters.find(item), item)
+                if other != item:
+                    raise GroupConflict(
+                        f"Collision in `apart` and `together`: {[other, item]} are "
+                        "in the same `together` group."
+                    )
+
+    def __validate_roster(self, roster: Roster) -> Roster:
+        """
+        Ensures that the specified `roster` also includes all members in
+        `together` and `apart`, and appends them if any are missing. The
+        order of `roster` is kept, and missing members follow in the order
+        they first appear.
+        """
+        roster = self.__freeze(roster)
+
+        # Nothing to verify because there were no pairs.
+        if not self.together and not self.apart:
+            return roster
+
+        return tuple(
+            dict.fromkeys(
+                itertools.chain(roster or (), *self.together or (), *self.apart or ())
+            )
+        )
+
+    def __compile_apart(self) -> Tuple[Conflicts, Memberships]:
+        """
+        Compiles `apart` into a mapping of each name to the set of names it
+        must be kept apart from, and a mapping of each name to the groups of
+        three or more it belongs to. Each group is a single frozenset shared
+        by its members.
+
+        Returns:
+            Tuple[Conflicts, Memberships]: Adjacency of the `apart` pairs, and
+                membership of the `apart` groups.
+        """
+        conflicts: Conflicts = {}
+        memberships: Memberships = {}
+        for group in self.apart or []:
+            if len(group) == 2:
+                item_1, item_2 = group
+                conflicts.setdefault(item_1, set()).add(item_2)
+                conflicts.setdefault(item_2, set()).add(item_1)
+                continue
+            key = frozenset(group)
+            for item in group:
+                memberships.setdefault(item, []).append(key)
+        return conflicts, memberships
+
+    def __digest(self) -> str:
+        """
+        Returns a SHA-256 digest of the canonical form of the constraints:
+        the sorted roster, and the sorted, de-duplicated pairs and groups.
+        """
+
+        def canonical(pairs: Pairs) -> List[List[str]]:
+            return sorted({tuple(sorted(pair)) for pair in pairs or []})
+
+        payload = json.dumps(
+            [
+                sorted(set(self.roster or [])),
+                canonical(self.together),
+                canonical(self.apart),
+            ],
+            separators=(",", ":"),
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ChartCache:
+    """
+    Bounded, thread-safe LRU cache of generated charts. Charts are keyed by
+    the `ConstraintSet` digest, `max_size`, `num_groups`, `exact`,
+    `decompose` and seed, so a single cache can be shared by every
+    `SeatingChart`. Charts generated within a time budget aren't cached,
+    since they depend on how fast the machine is as well as on the seed.
+    """
+
+    def __init__(self, maxsize: int = 128):
+        """
+        Args:
+            maxsize (int): Maximum number of charts kept. The least recently
+                used chart is dropped first. Defaults to 128.
+        """
+        if type(maxsize) is not int:
+            raise TypeError(f"{maxsize} is a `{type(maxsize)}`, and must be an `int`.")
+        if maxsize < 1:
+            raise PositiveInteger(f"{maxsize} must be greater than zero.")
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.__charts: "OrderedDict[CacheKey, Tuple[Tuple[str, ...], ...]]" = (
+            OrderedDict()
+        )
+        self.__lock = threading.Lock()
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}: {len(self)} of {self.maxsize} Charts, {self.hits} Hits, {self.misses} Misses"
+
+    def __len__(self):
+        return len(self.__charts)
+
+    def __contains__(self, key: CacheKey) -> bool:
+        return key in self.__charts
+
+    def get(self, key: CacheKey) -> Optional[Chart]:
+        """
+        Returns a copy of the chart stored under `key`, or `None`.
+        """
+        with self.__lock:
+            groups = self.__charts.get(key)
+            if groups is None:
+                self.misses += 1
+                return
+            self.hits += 1
+            self.__charts.move_to_end(key)
+        return [list(group) for group in groups]
+
+    def put(self, key: CacheKey, chart: Chart) -> None:
+        """
+        Stores a copy of `chart` under `key`.
+        """
+        groups = tuple(tuple(group) for group in chart)
+        with self.__lock:
+            self.__charts[key] = groups
+            self.__charts.move_to_end(key)
+            while len(self.__charts) > self.maxsize:
+                self.__charts.popitem(last=False)
+
+    def clear(self) -> None:
+        """
+        Drops every chart.
+        """
+        with self.__lock:
+            self.__charts.clear()
+
+
+class SeatingChart:
+    """
+    Main class for seating chart logic.
+    """
+
+    __slots__ = (
+        "max_size",
+        "num_groups",
+        "compact",
+        "exact",
+        "time_budget_ms",
+        "decompose",
+        "workers",
+        "preferences",
+        "exact_limit",
+        "__roster",
+        "__together",
+        "__apart",
+        "__constraints",
+        "__shared",
+        "__cache",
+        "__names",
+        "__ids",
+        "__conflicts",
+        "__memberships",
+        "__clusters",
+        "__indexes",
+        "__builder",
+        "__chart",
+        "__stats",
+        "__observer",
+    )
+
+    def __init__(
+        self,
+        roster: Roster = None,
+        together: Pairs = None,
+        apart: Pairs = None,
+        max_size: Number = None,
+        num_groups: Number = None,
+        compact: bool = False,
+        exact: bool = False,
+        profile: bool = False,
+        observer: Optional[Observer] = None,
+        constraints: Optional[ConstraintSet] = None,
+        cache: Optional[ChartCache] = None,
+        time_budget_ms: Optional[float] = None,
+        decompose: bool = False,
+        workers: Number = None,
+        preferences: Optional[Weights] = None,
+        exact_limit: Number = 100_000,
+    ):
+        """
+        Args:
+            roster (Roster): List of individuals included in the chart.
+                Defaults to `None`.
+            together (Pairs): List of pairs, or larger groups, of
+                individuals who should explicitly be grouped together.
+                Defaults to `None`.
+            apart (Pairs): List of pairs, or larger groups, of individuals
+                who should explicitly be separated from each other. Defaults
+                to `None`.
+            max_size (Number): Maximum size of a single group. Defaults to
+                unlimited (`None`).
+            num_groups (Number): Maximum number of groups. Defaults to
+                unlimited (`None`).
+            compact (bool): Store generated charts as interned integer ids
+                instead of nested lists of names. Once the chart is edited by
+                `add()` or `remove()`, its builder is kept as well. Defaults
+                to `False`.
+            exact (bool): When the greedy stages can't make a valid chart,
+                search for one exhaustively before raising. Defaults to
+                `False`.
+            profile (bool): Collect per-stage timings and counters in
+                `stats`. Defaults to `False`.
+            observer (Observer): Function called after every stage with the
+                stage's name and `stats`, e.g. to export metrics. Implies
+                `profile`. Defaults to `None`.
+            constraints (ConstraintSet): Pre-compiled `roster`, `together`
+                and `apart`, shared with other SeatingCharts instead of
+                passing the three separately. Defaults to `None`.
+            cache (ChartCache): Cache of charts generated by `new()` with a
+                `seed`, shared with other SeatingCharts. Defaults to `None`.
+            time_budget_ms (float): Keep generating charts for this many
+                milliseconds, and keep the best. Defaults to a single
+                attempt (`None`).
+            decompose (bool): When `together` and `apart` name at least a
+                million individuals, seat each of their connected
+                components on its own, then merge the components' groups
+                under `max_size` and `num_groups`, as the sequential stages
+                would lay them out. Smaller inputs use the sequential stages.
+                Defaults to `False`.
+            workers (Number): Number of worker processes for solving
+                components when decomposing. Defaults to the number of CPUs.
+                With a single worker, no pool is started.
+            preferences (Weights): Weight of each pair or larger group who'd
+                rather sit together (positive) or apart (negative). Unlike
+                `together` and `apart`, these may be broken, and are only
+                used by `optimize()`. Defaults to `None`.
+            exact_limit (Number): Maximum number of assignments the
+                exhaustive search of `exact` tries before giving up, or
+                `None` for no limit. Defaults to 100,000.
+        """
+        self.__shared = constraints is not None
+        if constraints is None:
+            constraints = ConstraintSet(roster, together, apart)
+        elif not (roster is None and together is None and apart is None):
+            raise ValueError(
+                "Pass either `constraints`, or `roster`, `together` and `apart`."
+            )
+        self.max_size = self.__validate_integer_inputs(max_size)
+        self.num_groups = self.__validate_integer_inputs(num_groups)
+
+        # The `ConstraintSet`'s tuples are shared until they're read or
+        # changed through `roster`, `together` or `apart`.
+        self.__together = constraints.together
+        self.__apart = constraints.apart
+        self.__roster = constraints.roster
+
+        self.compact = compact
+        self.exact = exact
+        self.time_budget_ms = self.__validate_time_budget(time_budget_ms)
+        self.decompose = decompose
+        self.workers = self.__validate_integer_inputs(workers)
+        self.preferences = self.__validate_preferences(preferences)
+        self.exact_limit = self.__validate_integer_inputs(exact_limit)
+        self.__constraints: Optional[ConstraintSet] = constraints
+        self.__cache = cache
+        self.__names: Optional[List[str]] = None
+        self.__ids: Optional[Dict[str, int]] = None
+        if compact:
+            self.__names = constraints.names
+            self.__ids = constraints.ids
+
+        self.__conflicts = constraints.conflicts
+        self.__memberships = constraints.memberships
+        self.__clusters = constraints.clusters
+        self.__indexes: Dict[str, _ListIndex] = {}
+        self.__builder: Optional[_ChartBuilder] = None
+        self.__chart: Union[Chart, _PackedChart, None] = None
+        self.__stats = Stats() if profile or observer is not None else None
+        self.__observer = observer
+
+    # +--------------------+
+    # | Data model methods |
+    # +--------------------+
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}: {len(self.__roster)} Individuals, {len(self)} Groups"
+
+    def __len__(self):
+        return len(self.__stored())
+
+    def __iter__(self):
+        return iter(self.__stored())
+
+    def __eq__(self, other):
+        return self.chart == other.chart
+
+    # +----------------+
+    # | Public methods |
+    # +----------------+
+
+    @property
+    def chart(self) -> Chart:
+        """
+        Returns generated seating chart, and creates it if it doesn't already
+            exist.
+
+        Returns:
+            Chart: Seating chart.
+        """
+        chart = self.__stored()
+        return chart.unpack() if self.compact else chart
+
+    @property
+    def roster(self) -> Roster:
+        """
+        Returns the individuals included in the chart, in the order of
+        `roster`, followed by anyone only named in `together` or `apart`.
+        """
+        if isinstance(self.__roster, tuple):
+            self.__roster = self.__copy(self.__roster)
+        return self.__roster
+
+    @roster.setter
+    def roster(self, roster: Roster) -> None:
+        self.__roster = roster
+
+    @property
+    def together(self) -> Pairs:
+        """
+        Returns the pairs, or larger groups, of individuals who should
+        explicitly be grouped together.
+        """
+        if isinstance(self.__together, tuple):
+            self.__together = self.__copy(self.__together)
+        return self.__together
+
+    @together.setter
+    def together(self, together: Pairs) -> None:
+        self.__together = together
+
+    @property
+    def apart(self) -> Pairs:
+        """
+        Returns the pairs, or larger groups, of individuals who should
+        explicitly be separated from each other.
+        """
+        if isinstance(self.__apart, tuple):
+            self.__apart = self.__copy(self.__apart)
+        return self.__apart
+
+    @apart.setter
+    def apart(self, apart: Pairs) -> None:
+        self.__apart = apart
+
+    @property
+    def constraints(self) -> Optional[ConstraintSet]:
+        """
+        Returns the compiled constraints, to share with other SeatingCharts,
+        or `None` once they've been changed by `add()` or `remove()`.
+
+        Returns:
+            Optional[ConstraintSet]: Compiled constraints.
+        """
+        self.__shared = self.__shared or self.__constraints is not None
+        return self.__constraints
+
+    @property
+    def stats(self) -> Optional[Stats]:
+        """
+        Returns the timings and counters collected so far, or `None` unless
+        profiling is on.
+
+        Returns:
+            Optional[Stats]: Collected statistics.
+        """
+        return self.__stats
+
+    def new(
+        self,
+        seed: Hashable = None,
+        time_budget_ms: Optional[float] = None,
+        score: Score = balance,
+    ) -> Chart:
+        """
+        Returns a new seating chart, even if one already exists.
+
+        With a time budget, charts are generated until the budget runs out,
+        each with `apart` handled in a new random order, and the one with
+        the lowest score is kept. At least one attempt is always made.
+
+        Args:
+            seed (Hashable): Seed for the random number generator, making the
+                chart reproducible. Seeded charts are stored in, and read
+                from, the `cache`. Defaults to `None`.
+            time_budget_ms (float): Milliseconds to spend generating charts.
+                Defaults to `time_budget_ms` of the SeatingChart.
+            score (Score): Function scoring a chart within a time budget,
+                where lower is better. Defaults to `balance`.
+
+        Returns:
+            Chart: Seating chart.
+        """
+        time_budget_ms = self.__validate_time_budget(time_budget_ms)
+        self.__refresh(seed, time_budget_ms, score)
+        return self.chart
+
+    @classmethod
+    def validate_only(
+        cls,
+        roster: Roster = None,
+        together: Pairs = None,
+        apart: Pairs = None,
+        max_size: Number = None,
+        num_groups: Number = None,
+    ) -> ConstraintSet:
+        """
+        Validates the arguments of a SeatingChart without generating a chart,
+        raising the same exceptions as the constructor. Inputs that can't
+        make a valid chart at all also raise `InvalidRequest`, as they would
+        at the start of generation.
+
+        Args:
+            roster (Roster): List of individuals included in the chart.
+            together (Pairs): List of pairs, or larger groups, of
+                individuals who should explicitly be grouped together.
+            apart (Pairs): List of pairs, or larger groups, of individuals
+                who should explicitly be separated from each other.
+            max_size (Number): Maximum size of a single group.
+            num_groups (Number): Maximum number of groups.
+
+        Returns:
+            ConstraintSet: Compiled constraints, which can be passed on to
+                `SeatingChart(constraints=...)`.
+        """
+        sc = cls(roster, together, apart, max_size, num_groups)
+        sc.__precheck()
+        return sc.constraints
+
+    def group_of(self, name: str) -> Number:
+        """
+        Returns the index of the group in `chart` that `name` is seated in.
+
+        Args:
+            name (str): Individual to look up.
+
+        Returns:
+            Number: Index of the group containing `name`, or `None` if
+                `name` isn't in the chart.
+        """
+        if self.compact and self.__builder is None:
+            return self.__stored().group_of(name)
+        if self.__builder is None:
+            self.__refresh()
+        return self.__builder.group_of(name)
+
+    def sample(self, n: int, seed: Number = None) -> Iterator[Chart]:
+        """
+        Generates `n` new seating charts, without changing `chart`. The
+        deterministic `together` and `apart` stages run once, and only the
+        randomized placement of everyone else is repeated per chart. With
+        `exact`, a chart the greedy stages cannot complete falls back to the
+        exact solver, as in `new()`.
+
+        Args:
+            n (int): Number of charts to generate.
+            seed (Number): Seed for the random number generator, making the
+                charts reproducible. Defaults to `None`.
+
+        Yields:
+            Chart: Seating chart.
+        """
+        rng = random.Random(seed)
+        self.__stage("precheck", None, self.__precheck)
+        try:
+            skeleton: Optional[_ChartBuilder] = self.__generate_skeleton()
+        except (InvalidRequest, GroupConflict):
+            if not self.exact:
+                raise
+            skeleton = None
+        remaining = self.__unplaced(skeleton) if skeleton is not None else None
+
+        for _ in range(n):
+            builder = None
+            if skeleton is not None:
+                try:
+                    builder = skeleton.copy()
+                    self.__stage(
+                        "remaining",
+                        builder,
+                        self.__handle_remaining,
+                        builder,
+                        remaining,
+                        rng,
+                    )
+                    self.__stage(
+                        "validate",
+                        builder,
+                        self.__validate_number_of_groups,
+                        builder.groups,
+                    )
+                except (InvalidRequest, GroupConflict):
+                    if not self.exact:
+                        raise
+                    builder = None
+            if builder is None:
+                self.__count_fallback()
+                builder = self.__stage("exact", None, self.__solve_exact, rng)
+            if self.__stats is not None:
+                self.__stats.charts += 1
+            yield builder.groups
+
+    def best_of(
+        self,
+        n: int,
+        seed: Number = None,
+        workers: Number = None,
+        score: Score = balance,
+    ) -> Chart:
+        """
+        Generates `n` candidate charts across a process pool, and keeps the
+        one with the lowest score as `chart`.
+
+        Each worker samples its share of the candidates with its own random
+        number generator, seeded from `seed`, so results are reproducible
+        for a given `seed` and number of workers.
+
+        Args:
+            n (int): Number of candidate charts to generate.
+            seed (Number): Master seed for the workers' random number
+                generators. Defaults to `None`.
+            workers (Number): Number of worker processes. Defaults to the
+                number of CPUs. With a single worker, no pool is started.
+            score (Score): Function scoring a chart, where lower is better.
+                It must be picklable, e.g. a module-level function. Defaults
+                to `balance`.
+
+        Returns:
+            Chart: Best seating chart.
+        """
+        n = self.__validate_integer_inputs(n)
+        workers = min(self.__validate_integer_inputs(workers) or os.cpu_count() or 1, n)
+
+        master = random.Random(seed)
+        counts = [n // workers + (index < n % workers) for index in range(workers)]
+        seeds = [master.getrandbits(64) for _ in counts]
+        settings = self.__settings()
+        if workers > 1:
+            # The pool already uses the CPUs, so samples don't start their own
+            settings["workers"] = 1
+
+        if workers == 1:
+            results = [_best_sample(settings, counts[0], seeds[0], score)]
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                results = list(
+                    executor.map(
+                        _best_sample,
+                        itertools.repeat(settings),
+                        counts,
+                        seeds,
+                        itertools.repeat(score),
+                    )
+                )
+
+        _, chart = min(results, key=lambda result: result[0])
+        self.__commit(_ChartBuilder(chart, self.__conflicts, self.__memberships))
+        return self.chart
+
+    def optimize(
+        self,
+        objective: Optional[Objective] = None,
+        iterations: int = 10_000,
+        seed: Number = None,
+        temperature: float = 0.0,
+    ) -> Chart:
+        """
+        Improves `chart` by local search, moving single individuals between
+        groups and swapping pairs of individuals. Each candidate is priced
+        incrementally by `objective`. Only individuals outside `together`
+        clusters move, and never into a group with someone they're kept
+        apart from, into a full group or out of a group they're alone in.
+
+        Args:
+            objective (Objective): Score to minimise. Defaults to
+                `Preferences(preferences)` when there are `preferences`, and
+                `SizeVariance()` otherwise.
+            iterations (int): Number of candidate moves. Defaults to 10,000.
+            seed (Number): Seed for the random number generator. Defaults to
+                `None`.
+            temperature (float): Starting temperature for simulated
+                annealing, cooled linearly to zero. At zero, only moves that
+                don't make the score worse are made. Defaults to `0.0`.
+
+        Returns:
+            Chart: Optimised seating chart.
+        """
+        if objective is None:
+            objective = (
+                Preferences(self.preferences) if self.preferences else SizeVariance()
+            )
+        self.__stored()
+        builder = self.__editable_builder()
+        rng = random.Random(seed)
+
+        self.__local_search(builder, objective, iterations, rng, temperature)
+
+        self.__commit(builder)
+        return self.chart
+
+    def rotations(
+        self, k: int, seed: Number = None, iterations: Number = None
+    ) -> Iterator[Chart]:
+        """
+        Generates `k` seating charts for successive rounds of an event, so
+        that as few people as possible sit together more than once, without
+        changing `chart`. `together` and `apart` are kept in every round.
+
+        Every round is generated as usual, then improved by swapping pairs of
+        individuals with `optimize()`'s local search, priced by a `Repeats`
+        objective that counts how often each pair has met so far.
+
+        Args:
+            k (int): Number of rounds.
+            seed (Number): Seed for the random number generator. Defaults to
+                `None`.
+            iterations (Number): Number of candidate swaps per round.
+                Defaults to twenty per individual.
+
+        Yields:
+            Chart: Seating chart for a single round.
+        """
+        k = self.__validate_integer_inputs(k)
+        rng = random.Random(seed)
+        repeats = Repeats()
+        if k:
+            self.__stage("precheck", None, self.__precheck)
+
+        for round_ in range(k or 0):
+            builder = self.__generate_chart(rng)
+            if round_ > 0:
+                self.__local_search(
+                    builder,
+                    repeats,
+                    iterations or 20 * len(builder.locations),
+                    rng,
+                    moves=False,
+                    floor=0.0,
+                )
+            repeats.record(builder.groups)
+            yield builder.snapshot()
+
+    def __local_search(
+        self,
+        builder: _ChartBuilder,
+        objective: Objective,
+        iterations: int,
+        rng: random.Random,
+        temperature: float = 0.0,
+        moves: bool = True,
+        floor: float = -math.inf,
+    ) -> None:
+        """
+        Internal method that improves `builder` in place by local search, as
+        described in `optimize()`. When annealing, the moves made since the
+        best chart seen are journaled and undone at the end, so the result is
+        never worse than the best chart, or than the starting one.
+
+        Args:
+            builder (_ChartBuilder): Seating chart, updated in place.
+            objective (Objective): Score to minimise.
+            iterations (int): Number of candidate moves.
+            rng (random.Random): Random number generator.
+            temperature (float): Starting temperature for simulated
+                annealing. Defaults to `0.0`.
+            moves (bool): Try moving single individuals as well as swapping
+                pairs. Swaps alone keep every group's size. Defaults to
+                `True`.
+            floor (float): Stop early once the score reaches this value, the
+                best possible. Defaults to no floor.
+        """
+        movable = [
+            item
+            for item in builder.locations
+            if len(self.__clusters.members(item)) == 1
+        ]
+        score = best = objective.reset(builder)
+        if temperature > 0:
+            builder.journal = []
+
+        for iteration in range(iterations if movable and len(builder) > 1 else 0):
+            if score <= floor:
+                break
+            item = rng.choice(movable)
+            source = builder.locations[item]
+            if not moves or rng.random() < 0.5:
+                other = rng.choice(movable)
+                target = builder.locations[other]
+                if target == source or not self.__can_swap(item, other, builder):
+                    continue
+                delta = objective.swap_delta(builder, item, other)
+            else:
+                other = None
+                target = rng.randrange(len(builder))
+                if target == source or not self.__can_move(item, target, builder):
+                    continue
+                delta = objective.move_delta(builder, item, target)
+
+            cooled = temperature * (1 - iteration / iterations)
+            if delta > 0 and (cooled <= 0 or rng.random() >= math.exp(-delta / cooled)):
+                continue
+
+            score += delta
+            if other is None:
+                builder.move(item, target)
+                objective.moved(builder, item, source, target)
+            else:
+                builder.swap(item, other)
+                objective.moved(builder, item, source, target)
+                objective.moved(builder, other, target, source)
+            if builder.journal is not None and score < best:
+                best = score
+                builder.journal = []
+
+        if builder.journal is not None:
+            if score > best:
+                builder.rollback()
+                objective.reset(builder)
+            builder.journal = None
+
+    def add(
+        self, name: Names = None, together: Pairs = None, apart: Pairs = None
+    ) -> None:
+        """
+        Adds individuals, pairs and groups to the seating chart. If a chart
+        already exists it is patched in place: only new individuals and
+        members of new pairs and groups are seated or moved, and everyone
+        else stays put. If the chart can't be patched, a new one is
+        generated.
+
+        Args:
+            name (Names): Individual, or list of individuals, to add.
+            together (Pairs): Pairs, or larger groups, of individuals who
+                should explicitly be grouped together.
+            apart (Pairs): Pairs, or larger groups, of individuals who
+                should explicitly be separated from each other.
+
+        Raises:
+            InvalidRequest: If no valid chart fits the added individuals and
+                constraints. The SeatingChart is left as it was.
+        """
+        names = self.__as_names(name)
+        together = self.__copy(together) or []
+        apart = self.__copy(apart) or []
+        self.__validate_additions(together, apart)
+        self.__detach_constraints()
+
+        builder = self.__editable_builder()
+        state = (
+            self.__roster,
+            self.__together,
+            self.__apart,
+            self.__builder,
+            self.__chart,
+        )
+        sizes = tuple(len(entries or []) for entries in state[:3] + (self.__names,))
+        if builder is not None:
+            builder.journal = []
+        try:
+            self.__add(names, together, apart, builder)
+        except BaseException:
+            self.__roster, self.__together, self.__apart = state[:3]
+            self.__restore(sizes, together, apart, builder)
+            self.__builder, self.__chart = state[3:]
+            raise
+        finally:
+            if builder is not None:
+                builder.journal = None
+
+    def __add(
+        self, names: Group, together: Pairs, apart: Pairs, builder: _ChartBuilder
+    ) -> None:
+        """
+        Internal method that adds validated individuals, pairs and groups for
+        `add()`, and patches `builder` if a chart exists.
+        """
+        known = builder.locations if builder is not None else set(self.__roster or [])
+        added = [
+            item
+            for item in dict.fromkeys(itertools.chain(names, *together, *apart))
+            if item not in known
+        ]
+
+        self.__extend("roster", added)
+        if self.compact:
+            for item in added:
+                if item not in self.__ids:
+                    self.__ids[item] = len(self.__names)
+                    self.__names.append(item)
+
+        self.__extend("together", together)
+        for group in together:
+            for item in group[1:]:
+                self.__clusters.union(group[0], item)
+
+        self.__extend("apart", apart)
+        for group in apart:
+            self.__record_apart(group, builder)
+
+        if builder is None:
+            return
+
+        patched = True
+        for group in together:
+            patched = patched and self.__settle(group[0], builder)
+
+        for group in apart:
+            collision = self.__collision(group, builder)
+            while patched and collision is not None:
+                # Move whichever `together` cluster is smaller.
+                item_1, item_2 = sorted(
+                    collision, key=lambda item: len(self.__clusters.members(item))
+                )
+                patched = self.__settle(item_1, builder) or self.__settle(
+                    item_2, builder
+                )
+                collision = self.__collision(group, builder)
+
+        for item in added:
+            if not patched or item in builder:
+                continue
+            if (
+                item in self.__clusters
+                or self.__conflicts.get(item)
+                or self.__memberships.get(item)
+            ):
+                patched = self.__settle(item, builder)
+            else:
+                self.__balance_nested_list(item, builder)
+
+        if patched and self.__within_limits(builder):
+            self.__commit(builder)
+        else:
+            # Drop the partly patched chart first, so that it isn't kept if
+            # the new constraints can't be satisfied at all.
+            self.__builder = None
+            self.__chart = None
+            self.__count_fallback()
+            self.__refresh()
+
+    def __restore(
+        self,
+        sizes: Tuple[int, ...],
+        together: Pairs,
+        apart: Pairs,
+        builder: Optional[_ChartBuilder],
+    ) -> None:
+        """
+        Internal method that undoes a failed `add()`, once `roster`,
+        `together` and `apart` point at their previous lists again. `sizes`
+        are the previous lengths of those lists and of the interned names.
+        """
+        *sizes, names_size = sizes
+        for entries, size in zip((self.__roster, self.__together, self.__apart), sizes):
+            if entries is not None:
+                del entries[size:]
+        self.__indexes = {}
+        if self.compact:
+            for item in self.__names[names_size:]:
+                del self.__ids[item]
+            del self.__names[names_size:]
+
+        if builder is not None:
+            builder.rollback()
+        for group in apart:
+            self.__forget_apart(group, builder)
+        if together:
+            self.__clusters = _DisjointSet.from_pairs(self.__together)
+
+    def remove(
+        self, name: Names = None, together: Pairs = None, apart: Pairs = None
+    ) -> None:
+        """
+        Removes individuals, pairs and groups from the seating chart. If a
+        chart already exists, removed individuals leave their groups and
+        nobody else moves. Pairs involving a removed individual are dropped
+        too, and larger groups lose that member.
+
+        Only the affected entries of `roster`, `together` and `apart` are
+        changed, through an index built on the first call. The last entry of
+        each list takes the place of every entry that's dropped.
+
+        Args:
+            name (Names): Individual, or list of individuals, to remove.
+            together (Pairs): Pairs or groups to drop from `together`.
+            apart (Pairs): Pairs or groups to drop from `apart`.
+        """
+        names = set(self.__as_names(name))
+        together = {frozenset(pair) for pair in together or []}
+        apart = {frozenset(pair) for pair in apart or []}
+
+        self.__detach_constraints()
+        builder = self.__editable_builder()
+
+        if self.__together is not None and (names or together):
+            index = self.__index("together")
+            affected: Dict[str, None] = {}
+            for group, _ in self.__shrink(index, names, together):
+                for item in group:
+                    affected.update(dict.fromkeys(self.__clusters.discard(item)))
+            keys = set().union(*map(index.keys_of, affected))
+            for key in sorted(keys, key=index.positions.__getitem__):
+                group = index.get(key)
+                for item in group[1:]:
+                    self.__clusters.union(group[0], item)
+
+        if self.__apart is not None and (names or apart):
+            for group, members in self.__shrink(self.__index("apart"), names, apart):
+                self.__forget_apart(group, builder)
+                if members:
+                    self.__record_apart(members, builder)
+
+        if names and self.__roster is not None:
+            index = self.__index("roster")
+            for item in sorted(names & index.positions.keys(), key=index.positions.get):
+                index.evict(item)
+
+        if builder is None:
+            return
+
+        for item in names:
+            if item in builder:
+                builder.evict(item)
+        self.__commit(builder)
+
+    def __index(self, attribute: str) -> _ListIndex:
+        """
+        Internal method that returns the index of `roster`, `together` or
+        `apart`, and builds it the first time it's needed.
+        """
+        entries = getattr(self, attribute)
+        index = self.__indexes.get(attribute)
+        if index is None or index.entries is not entries:
+            index = _ListIndex(entries, grouped=attribute != "roster")
+            self.__indexes[attribute] = index
+        return index
+
+    def __extend(self, attribute: str, entries: list) -> None:
+        """
+        Internal method that appends `entries` to `roster`, `together` or
+        `apart`, and to its index if it has one.
+        """
+        if not entries:
+            return
+        if getattr(self, attribute) is None:
+            setattr(self, attribute, [])
+        index = self.__indexes.get(attribute)
+        if index is not None and index.entries is getattr(self, attribute):
+            for entry in entries:
+                index.append(entry)
+        else:
+            getattr(self, attribute).extend(entries)
+
+    def __shrink(
+        self, index: _ListIndex, names: Set[str], keys: Set[FrozenSet[str]]
+    ) -> List[Tuple[Group, Group]]:
+        """
+        Internal method that drops the pairs and groups in `keys` from the
+        list behind `index`, and `names` from every pair and group. A pair or
+        group left with fewer than two members, or matching another one, is
+        dropped. Only the affected entries are visited.
+
+        Returns:
+            List[Tuple[Group, Group]]: Every changed pair or group, with what
+                is left of it, or an empty list if it was dropped.
+        """
+        touched = {key for key in keys if key in index}
+        for item in names:
+            touched.update(index.keys.get(item, ()))
+
+        changes = []
+        for key in sorted(touched, key=index.positions.__getitem__):
+            group = index.get(key)
+            members = [] if key in keys else [i for i in group if i not in names]
+            if len(members) > 1 and frozenset(members) not in index:
+                index.replace(key, members)
+            else:
+                index.evict(key)
+                members = []
+            changes.append((group, members))
+        return changes
+
+    def update(
+        self,
+        max_size: Number = False,
+        num_groups: Number = False,
+        rebalance: bool = False,
+    ) -> Optional[List[Move]]:
+        """
+        Updates the existing seating chart to meet an updated `max_size` or
+        `num_groups` parameter.
+
+        Args:
+            max_size (Number): Maximum size of a single group.
+            num_groups (Number): Maximum number of groups.
+            rebalance (bool): Adjust the existing chart by moving as few
+                individuals as possible, instead of generating a new one.
+                Overfull groups are split and surplus groups are merged.
+                Defaults to `False`.
+
+        Returns:
+            Optional[List[Move]]: When rebalancing, the individuals that
+                moved, with their group in the old and the new chart. `None`
+                if a new chart was generated instead.
+        """
+        if max_size is not False:
+            self.max_size = self.__validate_integer_inputs(max_size)
+
+        if num_groups is not False:
+            self.num_groups = self.__validate_integer_inputs(num_groups)
+
+        return self.__apply_update(rebalance)
+
+    async def anew(
+        self,
+        seed: Hashable = None,
+        timeout: Optional[float] = None,
+        executor: Optional[Executor] = None,
+    ) -> Chart:
+        """
+        Async counterpart of `new()`, which generates the chart in an
+        executor instead of blocking the event loop.
+
+        If the call is cancelled or times out, generation stops at the next
+        stage boundary and `chart` is left as it was. In a process pool, the
+        chart is generated by a fresh SeatingChart with the same settings, so
+        `stats`, `cache` and cooperative cancellation aren't available there.
+
+        Args:
+            seed (Hashable): Seed for the random number generator. Defaults
+                to `None`.
+            timeout (float): Seconds to wait before raising
+                `asyncio.TimeoutError`. Defaults to no limit.
+            executor (Executor): Thread or process pool to generate the
+                chart in. Defaults to the event loop's default executor.
+
+        Returns:
+            Chart: Seating chart.
+        """
+        if not isinstance(executor, ProcessPoolExecutor):
+            return await self.__offload(executor, timeout, self.new, seed)
+
+        settings = self.__settings()
+        chart = await self.__offload(executor, timeout, _new_chart, settings, seed)
+        self.__commit(_ChartBuilder(chart, self.__conflicts, self.__memberships))
+        return self.chart
+
+    async def aupdate(
+        self,
+        max_size: Number = False,
+        num_groups: Number = False,
+        rebalance: bool = False,
+        timeout: Optional[float] = None,
+        executor: Optional[Executor] = None,
+    ) -> Optional[List[Move]]:
+        """
+        Async counterpart of `update()`, which runs in an executor instead of
+        blocking the event loop.
+
+        If the call is cancelled or times out before the chart is replaced,
+        `max_size` and `num_groups` are restored straight away, and a
+        running update stops at its next stage boundary without changing
+        the chart.
+
+        Args:
+            max_size (Number): Maximum size of a single group.
+            num_groups (Number): Maximum number of groups.
+            rebalance (bool): Adjust the existing chart by moving as few
+                individuals as possible. Defaults to `False`.
+            timeout (float): Seconds to wait before raising
+                `asyncio.TimeoutError`. Defaults to no limit.
+            executor (Executor): Thread or process pool to update the chart
+                in. Rebalancing needs the existing chart, so it always runs
+                in a thread. Defaults to the event loop's default executor.
+
+        Returns:
+            Optional[List[Move]]: As returned by `update()`.
+        """
+        settings = (self.max_size, self.num_groups)
+
+        def restore() -> None:
+            self.max_size, self.num_groups = settings
+
+        if max_size is not False:
+            max_size = self.__validate_integer_inputs(max_size)
+        if num_groups is not False:
+            num_groups = self.__validate_integer_inputs(num_groups)
+        if max_size is not False:
+            self.max_size = max_size
+        if num_groups is not False:
+            self.num_groups = num_groups
+
+        if not isinstance(executor, ProcessPoolExecutor) or rebalance:
+            if rebalance and isinstance(executor, ProcessPoolExecutor):
+                executor = None
+            return await self.__offload(
+                executor, timeout, self.__apply_update, rebalance, restore=restore
+            )
+
+        try:
+            await self.anew(timeout=timeout, executor=executor)
+        except (asyncio.CancelledError, asyncio.TimeoutError):
+            restore()
+            raise
+        return
+
+    # +-----------------+
+    # | Private methods |
+    # +-----------------+
+
+    def __stored(self) -> Union[Chart, _PackedChart]:
+        """
+        Internal method that returns the stored chart, and creates it if it
+        doesn't already exist.
+        """
+        if self.__chart is None:
+            if self.__builder is None:
+                self.__refresh()
+            elif self.compact:
+                self.__chart = _PackedChart(
+                    self.__builder.groups, self.__names, self.__ids
+                )
+            else:
+                self.__chart = self.__builder.snapshot()
+        return self.__chart
+
+    def __editable_builder(self) -> Optional[_ChartBuilder]:
+        """
+        Internal method that returns the builder of the current chart, or
+        `None` if no chart has been generated. In compact mode the builder is
+        rebuilt from the packed chart the first time, and kept from then on,
+        so that later edits cost time proportional to the change.
+        """
+        if self.compact and self.__builder is None and self.__chart is not None:
+            self.__builder = _ChartBuilder(
+                self.__chart.unpack(), self.__conflicts, self.__memberships
+            )
+        return self.__builder
+
+    def __commit(self, builder: _ChartBuilder) -> None:
+        """
+        Internal method that stores a patched builder. The snapshot for
+        `chart`, or the packed chart in compact mode, is taken the next time
+        it's read.
+        """
+        self.__store(builder, None)
+
+    async def __offload(
+        self,
+        executor: Optional[Executor],
+        timeout: Optional[float],
+        function: Callable,
+        *args,
+        restore: Optional[Callable[[], None]] = None,
+    ) -> Any:
+        """
+        Internal method that runs `function` in `executor` and waits for it.
+        If the wait is cancelled or times out, a running generation is asked
+        to stop at its next stage boundary, and `restore` is called unless a
+        chart was already stored. Each call has its own `_Call`.
+        """
+        loop = asyncio.get_event_loop()
+        call = _Call()
+        if isinstance(executor, ProcessPoolExecutor):
+            future = loop.run_in_executor(executor, function, *args)
+        else:
+            future = loop.run_in_executor(
+                executor, self.__cancellable, call, function, *args
+            )
+        try:
+            return await asyncio.wait_for(future, timeout)
+        except (asyncio.CancelledError, asyncio.TimeoutError):
+            if call.cancel() and restore is not None:
+                restore()
+            raise
+
+    def __cancellable(self, call: _Call, function: Callable, *args) -> Any:
+        """
+        Internal method that runs `function` on a worker thread, as `call`.
+        """
+        _CALLS.call = call
+        try:
+            return function(*args)
+        finally:
+            _CALLS.call = None
+
+    def __store(
+        self, builder: Optional[_ChartBuilder], chart: Union[Chart, _PackedChart, None],
+    ) -> None:
+        """
+        Internal method that stores the builder and the chart. In a cancelled
+        async call nothing is stored, and the call stops instead.
+        """
+        call = getattr(_CALLS, "call", None)
+        if call is None:
+            self.__builder, self.__chart = builder, chart
+            return
+        with call.lock:
+            if call.cancelled:
+                raise _Cancelled("store")
+            self.__builder, self.__chart = builder, chart
+            call.stored = True
+
+    def __settings(self) -> Dict[str, Any]:
+        """
+        Internal method that returns the arguments for a SeatingChart in a
+        process pool worker, with the same constraints and generation
+        settings. Storage, profiling and caching stay with this SeatingChart.
+        """
+        return dict(
+            roster=self.__roster,
+            together=self.__together,
+            apart=self.__apart,
+            max_size=self.max_size,
+            num_groups=self.num_groups,
+            exact=self.exact,
+            time_budget_ms=self.time_budget_ms,
+            decompose=self.decompose,
+            workers=self.workers,
+            preferences=self.preferences,
+            exact_limit=self.exact_limit,
+        )
+
+    def __detach_constraints(self) -> None:
+        """
+        Internal method called before `add()` or `remove()` change the
+        constraints. `roster`, `together` and `apart` stop sharing the
+        `ConstraintSet`'s tuples, compiled constraints that are shared are
+        copied, and the chart stops being cached, as it no longer matches the
+        `ConstraintSet`.
+        """
+        if self.__constraints is None:
+            return
+        self.__constraints = None
+        # Reading them copies the tuples that are still shared into lists.
+        self.__roster, self.__together, self.__apart = (
+            self.roster,
+            self.together,
+            self.apart,
+        )
+        if not self.__shared:
+            return
+
+        self.__conflicts = {item: set(c) for item, c in self.__conflicts.items()}
+        self.__memberships = {item: list(g) for item, g in self.__memberships.items()}
+        self.__clusters = self.__clusters.copy()
+        if self.compact:
+            self.__names = list(self.__names)
+            self.__ids = dict(self.__ids)
+        if self.__builder is not None:
+            self.__builder.conflicts = self.__conflicts
+            self.__builder.memberships = self.__memberships
+
+    def __record_apart(self, group: Group, builder: Optional[_ChartBuilder]) -> None:
+        """
+        Internal method that compiles an `apart` pair into `conflicts`, or a
+        larger group into `memberships`, and counts it in `builder` if a
+        chart exists.
+        """
+        if len(group) == 2:
+            item_1, item_2 = group
+            if builder is not None:
+                builder.link(item_1, item_2)
+            else:
+                self.__conflicts.setdefault(item_1, set()).add(item_2)
+                self.__conflicts.setdefault(item_2, set()).add(item_1)
+            return
+
+        key = frozenset(group)
+        if builder is not None:
+            builder.join(key)
+        else:
+            for item in group:
+                self.__memberships.setdefault(item, []).append(key)
+
+    def __forget_apart(self, group: Group, builder: Optional[_ChartBuilder]) -> None:
+        """
+        Internal method that reverses `__record_apart()`.
+        """
+        if len(group) == 2:
+            item_1, item_2 = group
+            if builder is not None:
+                builder.unlink(item_1, item_2)
+            else:
+                self.__conflicts.get(item_1, set()).discard(item_2)
+                self.__conflicts.get(item_2, set()).discard(item_1)
+            return
+
+        key = frozenset(group)
+        if builder is not None:
+            builder.part(key)
+        else:
+            for item in group:
+                if key in self.__memberships.get(item, ()):
+                    self.__memberships[item].remove(key)
+
+    def __cache_key(
+        self, seed: Hashable, time_budget_ms: Optional[float]
+    ) -> Optional[CacheKey]:
+        """
+        Internal method that returns the key of the chart in `cache`, or
+        `None` if the chart can't be cached.
+        """
+        if (
+            self.__cache is None
+            or seed is None
+            or self.__constraints is None
+            or time_budget_ms is not None
+        ):
+            return
+        return (
+            self.__constraints.digest,
+            self.max_size,
+            self.num_groups,
+            bool(self.exact),
+            bool(self.decompose),
+            seed,
+        )
+
+    def __refresh(
+        self,
+        seed: Hashable = None,
+        time_budget_ms: Optional[float] = None,
+        score: Score = balance,
+    ) -> None:
+        """
+        Internal method that generates a new chart, and keeps both the
+        builder and a snapshot of its groups for `chart`. In compact mode
+        only the packed chart is kept.
+
+        Args:
+            seed (Hashable): Seed for the random number generator. Defaults
+                to `None`.
+            time_budget_ms (float): Milliseconds to spend generating charts.
+                Defaults to `time_budget_ms` of the SeatingChart.
+            score (Score): Function scoring charts within a time budget.
+                Defaults to `balance`.
+        """
+        time_budget_ms = time_budget_ms or self.time_budget_ms
+        key = self.__cache_key(seed, time_budget_ms)
+        groups = self.__cache.get(key) if key is not None else None
+        if groups is not None:
+            builder = _ChartBuilder(groups, self.__conflicts, self.__memberships)
+        else:
+            self.__stage("precheck", None, self.__precheck)
+            rng = random.Random(seed) if seed is not None else None
+            if time_budget_ms is None:
+                builder = self.__generate_chart(rng)
+            else:
+                builder = self.__generate_within(time_budget_ms, rng, score)
+            if key is not None:
+                self.__cache.put(key, builder.groups)
+        if self.compact:
+            self.__store(None, _PackedChart(builder.groups, self.__names, self.__ids))
+        else:
+            self.__store(builder, builder.snapshot())
+
+    def __precheck(self) -> None:
+        """
+        Internal method that rejects inputs that can't make a valid chart,
+        before any generation, using bounds that every valid chart meets:
+
+        1. The largest `together` cluster fits within `max_size`.
+        2. Individuals (or `together` clusters) who must all be kept apart
+           from each other fit within `num_groups`.
+        3. The roster fits within `max_size` x `num_groups` seats.
+
+        The second bound comes from a greedy search for a large clique in
+        `apart`, so some infeasible inputs are only found during generation.
+        """
+        largest = self.__clusters.largest()
+        if self.max_size is not None and len(largest) > self.max_size:
+            raise InvalidRequest(
+                f"Valid chart cannot be created: {len(largest)} individuals must "
+                f"sit together ({self.__preview(largest)}), but `max_size` is "
+                f"{self.max_size}."
+            )
+
+        if self.num_groups is not None:
+            clique = self.__apart_clique()
+            if len(clique) > self.num_groups:
+                raise InvalidRequest(
+                    f"Valid chart cannot be created: {len(clique)} individuals "
+                    f"or `together` clusters must all be kept apart "
+                    f"({self.__preview(clique)}), but `num_groups` is "
+                    f"{self.num_groups}."
+                )
+
+        if self.max_size is not None and self.num_groups is not None:
+            size = len(dict.fromkeys(self.__roster or []))
+            seats = self.max_size * self.num_groups
+            if size > seats:
+                raise InvalidRequest(
+                    f"Valid chart cannot be created: there are {size} "
+                    f"individuals, but only {self.max_size} x {self.num_groups} "
+                    f"= {seats} seats."
+                )
+
+    def __apart_clique(self) -> Group:
+        """
+        Internal method that greedily searches for a large set of `together`
+        clusters that must all be kept apart from each other, and returns a
+        member of each. The clique is grown from every cluster in order of
+        degree, until no remaining cluster has enough conflicts to beat it.
+        Every `apart` group of three or more is a clique too, so the search
+        starts from the largest one.
+        """
+
+        def unit(item: str) -> str:
+            return self.__clusters.find(item) if item in self.__clusters else item
+
+        adjacency: Conflicts = {}
+        for item, conflict_items in self.__conflicts.items():
+            if conflict_items:
+                adjacency.setdefault(unit(item), set()).update(
+                    unit(conflict_item) for conflict_item in conflict_items
+                )
+
+        def degree(item: str) -> int:
+            return len(adjacency[item])
+
+        # Each group is shared by all its members, so de-duplicate it first.
+        groups = {group for keys in self.__memberships.values() for group in keys}
+        best: Group = sorted(max(groups, key=len, default=()))
+        for item in sorted(adjacency, key=degree, reverse=True):
+            if degree(item) < len(best) or len(best) > self.num_groups:
+                break
+            clique = [item]
+            for neighbor in sorted(adjacency[item], key=degree, reverse=True):
+                if all(neighbor in adjacency[member] for member in clique[1:]):
+                    clique.append(neighbor)
+            if len(clique) > len(best):
+                best = clique
+        return best
+
+    def __generate_within(
+        self, time_budget_ms: float, rng: Optional[random.Random], score: Score
+    ) -> _ChartBuilder:
+        """
+        Internal method that generates charts until `time_budget_ms` runs
+        out, shuffling the order in which `apart` is handled between
+        attempts, and returns the chart with the lowest score.
+
+        Returns:
+            _ChartBuilder: Best seating chart, with its location index.
+        """
+        deadline = time.perf_counter() + time_budget_ms / 1000
+        rng = rng or random.Random()
+        apart = self.__apart
+        errors: Counter = Counter()
+        best, best_score, attempts = None, math.inf, 0
+
+        while True:
+            attempts += 1
+            try:
+                builder = self.__generate_chart(rng, apart)
+            except (InvalidRequest, GroupConflict) as error:
+                errors[f"{error.__class__.__name__}: {error}"] += 1
+            else:
+                builder_score = score(builder.groups)
+                if best is None or builder_score < best_score:
+                    best, best_score = builder, builder_score
+
+            if time.perf_counter() >= deadline:
+                break
+            if self.__stats is not None:
+                self.__stats.retries += 1
+            if apart:
+                apart = rng.sample(apart, len(apart))
+
+        if best is None:
+            reasons = "; ".join(f"{e} (x{n})" for e, n in errors.most_common(3))
+            raise InvalidRequest(
+                f"Valid chart cannot be created within {time_budget_ms} ms, "
+                f"after {attempts} attempts. Most common errors: {reasons}"
+            )
+        return best
+
+    def __generate_chart(
+        self, rng: Optional[random.Random] = None, apart: Pairs = None
+    ) -> _ChartBuilder:
+        """
+        Internal method that handles the many stages of actually creating and
+        validating the chart at various stages of generation. Every stage
+        updates the same builder in place.
+
+        Args:
+            rng (random.Random): Random number generator used to place
+                individuals outside `together` and `apart`. Defaults to the
+                `random` module.
+            apart (Pairs): `apart`, in the order to handle it. Defaults to
+                `apart` of the SeatingChart.
+
+        Returns:
+            _ChartBuilder: Completed seating chart, with its location index.
+        """
+        try:
+            builder = self.__generate_skeleton(apart)
+
+            self.__stage(
+                "remaining", builder, self.__handle_remaining, builder, None, rng
+            )
+
+            self.__stage(
+                "validate", builder, self.__validate_number_of_groups, builder.groups
+            )
+        except (InvalidRequest, GroupConflict):
+            if not self.exact:
+                raise
+            self.__count_fallback()
+            builder = self.__stage("exact", None, self.__solve_exact, rng)
+        if self.__stats is not None:
+            self.__stats.charts += 1
+        return builder
+
+    def __stage(
+        self, stage: str, builder: Optional[_ChartBuilder], function: Callable, *args
+    ) -> Any:
+        """
+        Internal method that runs a single stage of generation, `function`,
+        and records it in `stats` when profiling is on. Cancelled async calls
+        stop here, before the stage starts.
+
+        Args:
+            stage (str): Name of the stage.
+            builder (_ChartBuilder): Seating chart being updated by the
+                stage, whose placements and checks are counted. `None` if
+                the stage returns a new builder instead, or doesn't build a
+                chart.
+            function (Callable): Stage to run, called with `args`.
+
+        Returns:
+            Any: Return value of `function`.
+        """
+        call = getattr(_CALLS, "call", None)
+        if call is not None and call.cancelled:
+            raise _Cancelled(stage)
+        if self.__stats is None:
+            return function(*args)
+
+        placed = len(builder.locations) if builder is not None else 0
+        checks = builder.checks if builder is not None else 0
+        start = time.perf_counter()
+        result = function(*args)
+        seconds = time.perf_counter() - start
+
+        if builder is None:
+            builder = result if result is not None else _ChartBuilder()
+            placed = checks = 0
+        self.__stats.checks += builder.checks - checks
+        self.__stats.record(stage, seconds, len(builder.locations) - placed)
+        if self.__observer is not None:
+            self.__observer(stage, self.__stats)
+        return result
+
+    def __count_fallback(self) -> None:
+        """
+        Internal method that records a fallback in `stats` when profiling is
+        on.
+        """
+        if self.__stats is not None:
+            self.__stats.fallbacks += 1
+
+    def __solve_exact(self, rng: Optional[random.Random] = None) -> _ChartBuilder:
+        """
+        Internal method that seats everyone named in `together` and `apart`
+        with `_ExactSolver`, treating `apart` as graph colouring with
+        `max_size` as group capacity. Everyone else is then placed as usual.
+
+        Args:
+            rng (random.Random): Random number generator used to place
+                everyone else. Defaults to the `random` module.
+
+        Returns:
+            _ChartBuilder: Completed seating chart, with its location index.
+        """
+        units: Dict[str, int] = {}
+        members: Chart = []
+        for item in dict.fromkeys(self.__roster or []):
+            if (
+                item not in self.__clusters
+                and not self.__conflicts.get(item)
+                and not self.__memberships.get(item)
+            ):
+                continue
+            root = self.__clusters.find(item) if item in self.__clusters else item
+            if root not in units:
+                units[root] = len(members)
+                members.append([])
+            members[units[root]].append(item)
+
+        def unit_of(item: str) -> int:
+            return units[
+                self.__clusters.find(item) if item in self.__clusters else item
+            ]
+
+        adjacency = [0] * len(members)
+        for item, conflict_items in self.__conflicts.items():
+            for conflict_item in conflict_items:
+                unit, conflict_unit = unit_of(item), unit_of(conflict_item)
+                if unit == conflict_unit:
+                    raise GroupConflict(
+                        f"Collision in `apart` and `together`: {[item, conflict_item]}."
+                    )
+                adjacency[unit] |= 1 << conflict_unit
+
+        groups_apart = {g for groups in self.__memberships.values() for g in groups}
+        for group in groups_apart:
+            mask = 0
+            for item in group:
+                mask |= 1 << unit_of(item)
+            if bin(mask).count("1") < len(group):
+                raise GroupConflict(
+                    f"Collision in `apart` and `together`: {sorted(group)}."
+                )
+            for item in group:
+                unit = unit_of(item)
+                adjacency[unit] |= mask & ~(1 << unit)
+
+        num_groups = self.num_groups or max(len(members), 1)
+        capacity = None if self.max_size is None else self.max_size * num_groups
+        if capacity is not None and len(dict.fromkeys(self.__roster or [])) > capacity:
+            raise InvalidRequest(
+                "Valid chart cannot be created: there are more individuals than "
+                "`max_size` x `num_groups` seats."
+            )
+
+        solver = _ExactSolver(
+            [len(unit) for unit in members],
+            adjacency,
+            num_groups,
+            self.max_size,
+            self.exact_limit,
+        )
+        colors = solver.solve()
+        if colors is None and solver.reached_limit:
+            raise InvalidRequest(
+                f"Valid chart not found within `exact_limit` = {self.exact_limit} "
+                f"assignments of the exhaustive search. Please raise "
+                f"`exact_limit`, or change the number of groups, max group "
+                f"size, or the together / apart groupings."
+            )
+        if colors is None:
+            raise InvalidRequest(
+                "Valid chart cannot be created, even with an exhaustive search. "
+                "Please change the number of groups, max group size, or the "
+                "together / apart groupings."
+            )
 
-    def remove(
-        self, name: Names = None, together: Pairs = None, apart: Pairs = None
-    ) -> None:
-        raise NotImplementedError
+        groups: Chart = [[] for _ in range(num_groups)]
+        for unit, color in zip(members, colors):
+            groups[color] += unit
+        builder = _ChartBuilder(
+            [group for group in groups if group], self.__conflicts, self.__memberships
+        )
+
+        self.__handle_remaining(builder, rng=rng)
 
-    def update(self, max_size: Number = False, num_groups: Number = False) -> None:
+        _ = self.__validate_number_of_groups(builder.groups)
+        return builder
+
+    def __generate_skeleton(self, apart: Pairs = None) -> _ChartBuilder:
         """
-        Updates the existing seating chart to meet an updated `max_size` or
-        `num_groups` parameter.
+        Internal method that runs the deterministic stages of generation,
+        which seat everyone named in `together` and `apart`.
 
         Args:
-            max_size (Number): Maximum size of a single group.
-            num_groups (Number): Maximum number of groups.
+            apart (Pairs): `apart`, in the order to handle it. Defaults to
+                `apart` of the SeatingChart.
+
+        Returns:
+            _ChartBuilder: Seating chart before the randomized fill.
         """
-        if max_size is not False:
-            self.max_size = self.__validate_integer_inputs(max_size)
+        apart = self.__apart if apart is None else apart
+        if self.decompose and self.__count_constrained(apart) >= _POOL_THRESHOLD:
+            builder = self.__stage("decompose", None, self.__solve_components, apart)
+        else:
+            builder = _ChartBuilder(
+                conflicts=self.__conflicts, memberships=self.__memberships
+            )
+            self.__stage("together", builder, self.__handle_together, builder)
+            self.__stage("apart", builder, self.__handle_apart, builder, apart)
 
-        if num_groups is not False:
-            self.num_groups = self.__validate_integer_inputs(num_groups)
+        self.__stage("validate", builder, self.__validate_group_size, builder.groups)
+        return builder
 
-        self.__chart = self.__generate_chart()
+    def __count_constrained(self, apart: Pairs) -> int:
+        """
+        Internal method that counts the individuals named in `together` and
+        `apart`.
+        """
+        names = set(itertools.chain.from_iterable(self.__together or ()))
+        names.update(itertools.chain.from_iterable(apart or ()))
+        return len(names)
 
-        return
+    def __solve_components(self, apart: Pairs) -> _ChartBuilder:
+        """
+        Internal method that splits `together` and `apart` into connected
+        components, seats each component in its own groups, and merges them.
 
-    # +-----------------+
-    # | Private methods |
-    # +-----------------+
+        Components share no constraints, so each one is seated with the
+        usual `together` and `apart` stages, but only has to search its own
+        groups. Components are solved in shards of `_SHARD_SIZE`
+        individuals, in a process pool that is started once and reused when
+        there are several shards and more than one worker. The chart doesn't
+        depend on the number of workers.
 
-    def __generate_chart(self) -> Chart:
-        """
-        Internal method that handles the many stages of actually creating and
-        validating the chart at various stages of generation.
+        Args:
+            apart (Pairs): `apart`, in the order to handle it.
 
         Returns:
-            Chart: Completed seating chart.
+            _ChartBuilder: Seating chart before the randomized fill.
         """
-        chart_1 = self.__handle_together()
-        chart_2 = self.__handle_apart(chart_1)
+        components = _DisjointSet.from_pairs(
+            itertools.chain(self.__together or [], apart or [])
+        )
+
+        pairs: Dict[str, Tuple[List[Tuple[str, ...]], List[Tuple[str, ...]]]] = {}
+        sizes: Dict[str, int] = {}
+        for group in components.groups():
+            root = components.find(group[0])
+            pairs[root] = ([], [])
+            sizes[root] = len(group)
+        for pair in self.__together or []:
+            pairs[components.find(pair[0])][0].append(tuple(pair))
+        for pair in apart or []:
+            pairs[components.find(pair[0])][1].append(tuple(pair))
 
-        _ = self.__validate_group_size(chart_2)
+        shards: List[List[Tuple[Pairs, Pairs]]] = [[]]
+        people = 0
+        for root, component in pairs.items():
+            if people >= _SHARD_SIZE:
+                shards.append([])
+                people = 0
+            shards[-1].append(component)
+            people += sizes[root]
 
-        chart_3 = self.__handle_remaining(chart_2)
+        workers = min(self.workers or os.cpu_count() or 1, len(shards))
+        if workers == 1:
+            results = [_solve_shard(shard, self.max_size) for shard in shards]
+        else:
+            results = list(
+                _shard_pool(workers).map(
+                    _solve_shard, shards, itertools.repeat(self.max_size)
+                )
+            )
+        solved = [chart for charts, _ in results for chart in charts]
 
-        _ = self.__validate_number_of_groups(chart_3)
-        return chart_3
+        builder = self.__merge_components(solved)
+        builder.checks += sum(checks for _, checks in results)
+        return builder
 
-    def __handle_together(self) -> Chart:
+    def __merge_components(self, components: List[Chart]) -> _ChartBuilder:
         """
-        Internal method that handles the grouping of explicit pairs
-        (`together`).
+        Internal method that merges the groups of every component into a
+        single chart, laid out as the sequential stages would lay it out.
+        Groups holding a `together` cluster go first, largest first, each in
+        a group of its own, and are only merged into the smallest group
+        without anything else from their component once there are
+        `num_groups`. Groups of `apart` members then go into the first group
+        with room for them and nothing else from their component, as
+        `_ChartBuilder.append()` would place them, or into a new group.
+
+        Args:
+            components (List[Chart]): Groups of each component.
 
         Returns:
-            Chart: Seating chart with `together` pairs.
+            _ChartBuilder: Merged seating chart.
         """
-        groups: list = []
-        if self.together is None:
-            return groups
+        pieces = [
+            (group, component)
+            for component, groups in enumerate(components)
+            for group in groups
+        ]
+        pieces.sort(
+            key=lambda piece: (piece[0][0] in self.__clusters, len(piece[0])),
+            reverse=True,
+        )
 
-        for pair in self.together:
-            # Seed `groups` list if it's empty.
-            if groups == []:
-                groups.append(pair)
-                continue
+        builder = _ChartBuilder(
+            conflicts=self.__conflicts, memberships=self.__memberships
+        )
+        owners: List[Set[int]] = []
+        smallest: List[Tuple[int, int]] = []
+        # Indexes of groups that may have room, in order
+        available: List[int] = []
+        for group, component in pieces:
+            index = None
+            if group[0] not in self.__clusters:
+                index = self.__first_fit(builder, available, owners, group, component)
+            elif self.num_groups is not None and len(builder) >= self.num_groups:
+                index = self.__smallest_fit(builder, smallest, owners, group, component)
 
-            pair_added_to_group = False
-            for group in groups:
-                group_pair_overlap = bool(set(pair) & set(group))
-
-                # One or more members already exists in the group ->, add
-                # remaining members to thar group.
-                if group_pair_overlap:
-                    group_pair_union = list(set(pair) | set(group))
-                    groups.remove(group)
-                    groups.append(group_pair_union)
-                    pair_added_to_group = True
-                    break
+            if index is None:
+                index = builder.add_group(group)
+                owners.append({component})
+                available.append(index)
+            else:
+                for item in group:
+                    builder.place(item, index)
+                owners[index].add(component)
+            heapq.heappush(smallest, (len(builder.groups[index]), index))
+        return builder
 
-            if not pair_added_to_group:
-                groups.append(pair)
+    def __first_fit(
+        self,
+        builder: _ChartBuilder,
+        available: List[int],
+        owners: List[Set[int]],
+        group: Group,
+        component: int,
+    ) -> Optional[int]:
+        """
+        Internal method that returns the first group in `available` with room
+        for `group` and nothing else from its component, or `None`. Groups
+        that are full are dropped from `available`.
+        """
+        position = 0
+        while position < len(available):
+            index = available[position]
+            size = len(builder.groups[index])
+            if self.max_size is not None and size >= self.max_size:
+                del available[position]
+                continue
+            if component not in owners[index] and (
+                self.max_size is None or size + len(group) <= self.max_size
+            ):
+                return index
+            position += 1
+        return None
 
-        return sorted(groups, key=len, reverse=True)
+    def __smallest_fit(
+        self,
+        builder: _ChartBuilder,
+        smallest: List[Tuple[int, int]],
+        owners: List[Set[int]],
+        group: Group,
+        component: int,
+    ) -> Optional[int]:
+        """
+        Internal method that returns the smallest group in the `smallest`
+        heap if it has room for `group` and nothing else from its component,
+        or `None`. Stale heap entries are discarded.
+        """
+        skipped = []
+        index = None
+        while smallest:
+            size, candidate = heapq.heappop(smallest)
+            if size != len(builder.groups[candidate]):
+                continue
+            skipped.append((size, candidate))
+            if component not in owners[candidate]:
+                if self.max_size is None or size + len(group) <= self.max_size:
+                    index = candidate
+                break
+        for entry in skipped:
+            heapq.heappush(smallest, entry)
+        return index
 
-    def __handle_apart(self, chart: Chart) -> Chart:
+    def __handle_together(self, builder: _ChartBuilder) -> None:
         """
-        Internal method that handles the separation of explicit pairs
-        (`apart`).
+        Internal method that handles the grouping of explicit pairs
+        (`together`).
 
         Args:
-            chart (Chart): Seating chart created by `__handle_together()`.
+            builder (_ChartBuilder): Empty seating chart, updated in place.
+        """
+        for group in sorted(self.__clusters.groups(), key=len, reverse=True):
+            builder.add_group(group)
 
-        Returns:
-            Chart: Seating chart with `apart` pairs.
+    def __handle_apart(self, builder: _ChartBuilder, apart: Pairs = None) -> None:
         """
-        chart = copy.deepcopy(chart)
+        Internal method that handles the separation of explicit pairs and
+        groups (`apart`). Members who are already seated stay put, and the
+        others are appended one at a time, so a group costs one step per
+        member rather than per pair of members.
 
-        if self.apart is None:
-            return chart
+        Args:
+            builder (_ChartBuilder): Seating chart created by
+                `__handle_together()`, updated in place.
+            apart (Pairs): `apart`, in the order to handle it. Defaults to
+                `apart` of the SeatingChart.
+        """
+        apart = self.__apart if apart is None else apart
+        if apart is None:
+            return
 
-        for pair in self.apart:
-            item_1, item_2 = pair
-            item_1_index = self.__get_nested_index(item_1, chart)
-            item_2_index = self.__get_nested_index(item_2, chart)
+        for group in apart:
+            for item in group:
+                if item not in builder:
+                    builder.append(item, self.max_size)
 
-            # 1. Chart is empty
-            if chart == []:
-                chart = [[item_1], [item_2]]
+    def __within_limits(self, builder: _ChartBuilder) -> bool:
+        """
+        Internal method that checks whether a patched chart still meets
+        `max_size` and `num_groups`.
+        """
+        if not len(builder):
+            return True
+        return (self.max_size is None or builder.largest() <= self.max_size) and (
+            self.num_groups is None or len(builder) <= self.num_groups
+        )
 
-            # 2. Pair is already grouped, and members are in different lists; good!
-            elif (
-                item_1_index is not None
-                and item_2_index is not None
-                and item_1_index != item_2_index
-            ):
+    def __collision(self, group: Group, builder: _ChartBuilder) -> Optional[Group]:
+        """
+        Internal method that returns two members of an `apart` pair or group
+        who sit in the same group of `builder`, or `None` if there are none.
+        """
+        seated: Dict[int, str] = {}
+        for item in group:
+            index = builder.group_of(item)
+            if index is None:
                 continue
+            other = seated.setdefault(index, item)
+            if other != item:
+                return [other, item]
+        return
 
-            # 3. One pair member is grouped, other remaining.
-            elif ((item_1_index is None) ^ (item_2_index is None)) and (
-                (item_1_index is not None) ^ (item_2_index is not None)
-            ):
-                remaining_item = item_1 if item_1_index is None else item_2
-                chart = self.__append_item(remaining_item, chart)
-
-            # 4. Both remaining.
-            elif item_1_index is None and item_2_index is None:
-                chart = self.__append_item(item_1, chart)
-                chart = self.__append_item(item_2, chart)
+    def __apply_update(self, rebalance: bool) -> Optional[List[Move]]:
+        """
+        Internal method that updates the chart to the current `max_size` and
+        `num_groups`, as described in `update()`. The chart is rebalanced on
+        a copy, so it's only replaced once the update succeeds.
+        """
+        builder = self.__editable_builder() if rebalance else None
+        if builder is not None:
+            builder = builder.copy()
+            moves = self.__rebalance(builder)
+            if moves is not None:
+                self.__commit(builder)
+                return moves
+            self.__count_fallback()
 
-        return chart
+        self.__refresh()
+        return
 
-    def __get_nested_index(self, item: str, chart: Chart) -> Number:
+    def __rebalance(self, builder: _ChartBuilder) -> Optional[List[Move]]:
         """
-        Returns the index of an item inside a nested list.
+        Internal method that adjusts an existing chart to the current
+        `max_size` and `num_groups`. The smallest `together` clusters are
+        moved out of overfull groups, then the smallest groups are merged
+        into the others until there are few enough.
 
         Args:
-            item (str): Variable we're searching for.
-            chart (Chart): Seating chart.
+            builder (_ChartBuilder): Seating chart, updated in place.
 
         Returns:
-            Number: Index of the list inside the nested list that contains
-                `item`. Returns None if not found.
+            Optional[List[Move]]: Individuals that moved, or `None` if the
+                chart couldn't be rebalanced.
         """
-        index = [chart.index(i) for i in chart if item in i]
+        original = {id(group): index for index, group in enumerate(builder.groups)}
+        builder.origins = {}
 
-        if len(index) == 0:
-            return
-        if len(index) == 1:
-            return index[0]
-        else:
-            raise ValueError(f"Value '{item}' occurrs in more than one list.")
+        index = 0
+        while self.max_size is not None and index < len(builder):
+            group = builder.groups[index]
+            movable = sorted(group, key=lambda item: len(self.__clusters.members(item)))
+            for item in movable:
+                if len(group) <= self.max_size:
+                    break
+                if builder.group_of(item) == index:
+                    self.__settle(item, builder, exclude=index)
+            if len(group) > self.max_size:
+                return
+            index += 1
 
-    def __append_item(self, item: str, chart: Chart) -> Chart:
+        while self.num_groups is not None and len(builder) > self.num_groups:
+            _, index = builder.smallest()
+            for item in list(builder.groups[index]):
+                if builder.group_of(item) != index:
+                    continue
+                if not self.__settle(item, builder, exclude=index):
+                    return
+
+        moves = [
+            Move(item, original[id(group)], builder.group_of(item))
+            for item, group in builder.origins.items()
+            if builder.groups[builder.group_of(item)] is not group
+        ]
+        builder.origins = None
+        return moves
+
+    def __settle(
+        self, item: str, builder: _ChartBuilder, exclude: Number = None
+    ) -> bool:
         """
-        Append an item to a chart, verifying that it obeys groups and
-        separation rules.
+        Internal method that seats the `together` cluster containing `item`
+        in a single group, without breaking `apart` pairs or `max_size`.
+        Groups already holding most of the cluster are tried first, then the
+        others from smallest to largest, so as few people as possible move.
+        If none fits, the cluster gets a new group.
 
         Args:
-            item (str): Item being appended.
-            chart (Chart): Nested list.
+            item (str): Member of the cluster being seated.
+            builder (_ChartBuilder): Seating chart, updated in place.
+            exclude (Number): Index of a group the cluster must leave.
+                Defaults to `None`.
 
         Returns:
-            Chart: Updated list with item appended.
+            bool: Whether the cluster could be seated.
         """
-        chart = copy.deepcopy(chart)
-        appended = False
-
-        for index, group in enumerate(chart):
-            if item in group:
-                continue
-
-            can_add_item_to_group = True
-            for apart_pair in self.apart:
-                if item not in apart_pair:
-                    continue
+        cluster = self.__clusters.members(item)
+        if self.max_size is not None and len(cluster) > self.max_size:
+            return False
 
-                # Item we're appending has an "apart" constraint. Verify that
-                # the group we're trying to add "item" to doesn't cause
-                # conflict.
-                apart_pair = copy.deepcopy(apart_pair)
-                apart_pair.remove(item)
-                conflict_item = apart_pair[0]
+        current = Counter(builder.group_of(member) for member in cluster)
+        current.pop(None, None)
+        # Other groups can only fit the whole cluster.
+        limit = self.max_size - len(cluster) if self.max_size is not None else None
+        candidates = itertools.chain(
+            (index for index, _ in current.most_common()),
+            (index for index in builder.by_size(limit) if index not in current),
+        )
 
-                if conflict_item in group:
-                    can_add_item_to_group = False
-                    break
+        for index in candidates:
+            if index != exclude and self.__fits(cluster, index, builder):
+                break
+        else:
+            if self.num_groups is not None and len(builder) >= self.num_groups:
+                return False
+            index = builder.add_group([])
 
-            if can_add_item_to_group:
-                if self.max_size is not None and len(group) >= self.max_size:
-                    continue
-                chart[index] += [item]
-                appended = True
+        for member in cluster:
+            location = builder.group_of(member)
+            if location is None:
+                builder.place(member, index)
+            elif location != index:
+                index = builder.move(member, index)
+        return True
 
-            if appended:
-                break
+    def __can_move(self, item: str, target: int, builder: _ChartBuilder) -> bool:
+        """
+        Internal method that checks whether local search may move `item` to
+        the group at `target`.
+        """
+        return (
+            len(builder.groups[builder.locations[item]]) > 1
+            and (self.max_size is None or len(builder.groups[target]) < self.max_size)
+            and builder.can_place(item, target)
+        )
 
-        if not appended:
-            chart.append([item])
+    def __can_swap(self, item_1: str, item_2: str, builder: _ChartBuilder) -> bool:
+        """
+        Internal method that checks whether local search may swap the groups
+        of `item_1` and `item_2`. Conflicts between the two don't count,
+        since they still sit apart afterwards.
+        """
+        for item, other in ((item_1, item_2), (item_2, item_1)):
+            counts = builder.group_conflicts[builder.locations[other]]
+            own = 1 if other in self.__conflicts.get(item, ()) else 0
+            if counts.get(item, 0) > own:
+                return False
+            for group in self.__memberships.get(item, ()):
+                if counts.get(group, 0) > (1 if other in group else 0):
+                    return False
+        return True
 
-        return chart
+    def __fits(self, cluster: Group, index: int, builder: _ChartBuilder) -> bool:
+        """
+        Internal method that checks whether every member of `cluster` can sit
+        in the group at `index`.
+        """
+        incoming = [member for member in cluster if builder.group_of(member) != index]
+        if (
+            self.max_size is not None
+            and len(builder.groups[index]) + len(incoming) > self.max_size
+        ):
+            return False
+        return all(builder.can_place(member, index) for member in cluster)
 
-    def __handle_remaining(self, chart: Chart) -> Chart:
+    def __handle_remaining(
+        self,
+        builder: _ChartBuilder,
+        remaining: Optional[Group] = None,
+        rng: Optional[random.Random] = None,
+    ) -> None:
         """
         Internal method that handles individuals not specified in explicit
         pairings (e.g. `together` and `apart`).
 
         Args:
-            chart (Chart): Seating chart created by `__handle_apart()`.
-
-        Returns:
-            Chart: Complete seating chart.
+            builder (_ChartBuilder): Seating chart created by
+                `__handle_apart()`, updated in place.
+            remaining (Group): Individuals who haven't been seated yet.
+                Defaults to everyone in `roster` missing from `builder`.
+            rng (random.Random): Random number generator used to shuffle
+                `remaining`. Defaults to the `random` module.
         """
-        chart = copy.deepcopy(chart)
-        already_placed = set(itertools.chain(*chart))
-        remaining = set(copy.deepcopy(self.roster))
-
-        remaining = list(remaining - already_placed)
-        random.shuffle(remaining)
+        if remaining is None:
+            remaining = self.__unplaced(builder)
+        else:
+            remaining = list(remaining)
+        (rng or random).shuffle(remaining)
 
         for item in remaining:
-            chart = self.__balance_nested_list(item, chart)
+            self.__balance_nested_list(item, builder)
 
-        return chart
+    def __unplaced(self, builder: _ChartBuilder) -> Group:
+        """
+        Internal method that returns everyone in `roster` who hasn't been
+        seated in `builder`.
+        """
+        roster = dict.fromkeys(self.__roster or [])
+        return [item for item in roster if item not in builder]
 
-    def __balance_nested_list(self, item: str, chart: Chart) -> Chart:
+    def __balance_nested_list(self, item: str, builder: _ChartBuilder) -> None:
         """
         Helper method for adding a single item to a chart, in the matter that
         will best satisfy `max_size` and `num_groups` constraints.
 
         Args:
             item (str): Item being appended.
-            chart (Chart): Nested list.
-
-        Returns:
-            Chart: Seating chart with `item` inserted.
+            builder (_ChartBuilder): Seating chart, updated in place.
         """
-        chart = copy.deepcopy(chart)
-
-        if chart == []:
-            chart.append([item])
-            return chart
+        if len(builder) == 0:
+            builder.add_group([item])
+            return
 
-        group_sizes = [len(i) for i in chart]
-        all_same_len = len(set(group_sizes)) == 1
-        max_group_size = max(group_sizes)
-        num_current_groups = len(chart)
-        index_min_size = group_sizes.index(min(group_sizes))
+        min_group_size, index_min_size = builder.smallest()
+        max_group_size = builder.largest()
+        all_same_len = min_group_size == max_group_size
+        num_current_groups = len(builder)
 
         if self.max_size is not None and self.max_size < max_group_size:
             raise InvalidRequest("Largest group exceeds `max_size` parameter")
@@ -375,29 +3602,46 @@ class SeatingChart:
             )
 
         if self.num_groups is not None and num_current_groups < self.num_groups:
-            chart.append([item])
+            builder.add_group([item])
         elif (
             self.max_size is not None
             and all_same_len
             and (self.max_size <= max_group_size)
         ):
-            chart.append([item])
+            builder.add_group([item])
         else:
-            chart[index_min_size] += [item]
-
-        return chart
+            builder.place(item, index_min_size)
 
     # +----------------+
     # | Helper methods |
     # +----------------+
 
+    def __as_names(self, name: Names) -> Group:
+        """
+        Returns a single name or a list of names as a list.
+        """
+        if name is None:
+            return []
+        if isinstance(name, str):
+            return [name]
+        return list(name)
+
+    def __preview(self, names: Group, limit: int = 5) -> str:
+        """
+        Helper method that returns the first `limit` names as a
+        comma-separated string.
+        """
+        preview = ", ".join(names[:limit])
+        return preview + ", ..." if len(names) > limit else preview
+
     def __copy(self, item: Any) -> Any:
         """
-        Returns a deepcopy of the item, or `None`.
+        Returns a copy of a roster or a list of pairs, or `None`. Names are
+        immutable strings, so only the containers are copied.
         """
         if item is None:
             return
-        return copy.deepcopy(item)
+        return [i if isinstance(i, str) else list(i) for i in item]
 
     # +--------------------+
     # | Validation methods |
@@ -415,52 +3659,128 @@ class SeatingChart:
             raise PositiveInteger(f"{number} must be greater than zero, or `None`.")
         return number
 
-    def __validate_together_apart(
-        self, together: Pairs, apart: Pairs
-    ) -> Tuple[Pairs, Pairs]:
+    def __validate_additions(self, together: Pairs, apart: Pairs) -> None:
         """
-        Ensures there are no collisions in `together` and `apart`.
+        Ensures that pairs and groups passed to `add()` aren't duplicates,
+        and don't collide with each other or with the existing `together` and
+        `apart` pairs and groups, including through `together` clusters they
+        would merge. Only the clusters touched by the new pairs and groups
+        are checked.
         """
-        together = self.__copy(together)
-        apart = self.__copy(apart)
+        added: Conflicts = {}
+        added_groups: Memberships = {}
+        existing: Set[FrozenSet[str]] = set()
+        for group in apart:
+            key = _group_key(group, "apart")
+            if len(group) == 2:
+                item_1, item_2 = group
+                if item_2 in added.get(item_1, ()) or item_2 in self.__conflicts.get(
+                    item_1, ()
+                ):
+                    raise DuplicatePair(
+                        f"Duplicate pair in `apart`: {[item_1, item_2]}."
+                    )
+                added.setdefault(item_1, set()).add(item_2)
+                added.setdefault(item_2, set()).add(item_1)
+                continue
 
-        if together is None or apart is None:
-            return together, apart
+            if key in existing or key in self.__memberships.get(group[0], ()):
+                raise DuplicatePair(f"Duplicate group in `apart`: {list(group)}.")
+            existing.add(key)
+            for item in group:
+                added_groups.setdefault(item, []).append(key)
 
-        for pair_1, pair_2 in itertools.product(together, apart):
-            if set(pair_1) == set(pair_2):
-                raise GroupConflict(
-                    f"Collision in `apart` and `together`: {pair_1} - {pair_2}."
+        def root(item: str) -> str:
+            return self.__clusters.find(item) if item in self.__clusters else item
+
+        # An existing `together` pair or group lies within a single cluster,
+        # so the existing keys are only needed for groups that do too.
+        together_keys: Set[FrozenSet[str]] = set()
+        loaded = False
+        for group in together:
+            key = _group_key(group, "together")
+            if not loaded and len(set(map(root, key))) == 1:
+                together_keys.update(map(frozenset, self.__together or []))
+                loaded = True
+            if key in together_keys:
+                kind = "pair" if len(group) == 2 else "group"
+                raise DuplicatePair(f"Duplicate {kind} in `together`: {list(group)}.")
+            together_keys.add(key)
+
+        # Clusters as they will be once `together` is added, checked against
+        # both the existing and the added `apart` pairs and groups.
+        merged = _DisjointSet.from_pairs(
+            [[root(item) for item in group] for group in together]
+        )
+        for roots in merged.groups():
+            cluster = set(
+                itertools.chain.from_iterable(map(self.__clusters.members, roots))
+            )
+            seen: Dict[FrozenSet[str], str] = {}
+            for member in cluster:
+                conflict_items = cluster & (
+                    self.__conflicts.get(member, set()) | added.get(member, set())
                 )
+                if conflict_items:
+                    raise GroupConflict(
+                        f"Collision in `apart` and `together`: "
+                        f"{[member, min(conflict_items)]}."
+                    )
+                for group in itertools.chain(
+                    self.__memberships.get(member, ()), added_groups.get(member, ())
+                ):
+                    other = seen.setdefault(group, member)
+                    if other != member:
+                        raise GroupConflict(
+                            f"Collision in `apart` and `together`: {[other, member]}."
+                        )
 
-        return together, apart
+        for group in apart:
+            roots: Dict[str, str] = {}
+            for item in group:
+                other = roots.setdefault(root(item), item)
+                if other != item:
+                    raise GroupConflict(
+                        f"Collision in `apart` and `together`: {[other, item]}."
+                    )
 
-    def __validate_roster(self, roster: Roster) -> Roster:
+    def __validate_time_budget(
+        self, time_budget_ms: Optional[float]
+    ) -> Optional[float]:
         """
-        Ensures that the specified `roster` also includes all members in
-        `together` and `apart`, and appends them if any are missing.
+        Ensures that a time budget is a positive number or `None`, and
+        returns it.
         """
-        roster = self.__copy(roster)
-
-        all_together_apart = set()
-        if self.together is not None:
-            for pair in self.together:
-                all_together_apart |= set(pair)
-        if self.apart is not None:
-            for pair in self.apart:
-                all_together_apart |= set(pair)
-
-        # Nothing to verify because there were no pairs.
-        if not all_together_apart:
-            return roster
-
-        # Add any individuals not in `roster` to the object.
-        if roster is None:
-            roster = []
-        roster = set(roster)
+        if time_budget_ms is None:
+            return
+        if isinstance(time_budget_ms, bool) or not isinstance(
+            time_budget_ms, (int, float)
+        ):
+            raise TypeError(
+                f"{time_budget_ms} is a `{type(time_budget_ms)}`, and must be a number."
+            )
+        if time_budget_ms <= 0:
+            raise ValueError(f"{time_budget_ms} must be greater than zero, or `None`.")
+        return time_budget_ms
 
-        roster = list(roster | all_together_apart)
-        return sorted(roster)
+    def __validate_preferences(
+        self, preferences: Optional[Weights]
+    ) -> Optional[Weights]:
+        """
+        Ensures that every preference is a pair or larger group of different
+        individuals with a numeric weight, and returns a copy.
+        """
+        if preferences is None:
+            return
+        weights: Weights = {}
+        for group, weight in preferences.items():
+            _ = _group_key(group, "preferences")
+            if isinstance(weight, bool) or not isinstance(weight, (int, float)):
+                raise TypeError(
+                    f"{weight} is a `{type(weight)}`, and must be a number."
+                )
+            weights[tuple(group)] = weight
+        return weights
 
     def __validate_group_size(self, chart: Chart) -> None:
         """
@@ -487,18 +3807,191 @@ class SeatingChart:
             )
         return
 
+    # +----------------+
+    # | Loader Methods |
+    # +----------------+
+
+    @classmethod
+    def from_csv(cls, source: Source, **kwargs: Any) -> "SeatingChart":
+        """
+        Creates a SeatingChart from a CSV file, read one row at a time. Each
+        row is a record naming its kind, then one or more individuals. A
+        header row starting with `kind` is skipped.
+
+            kind,name,other
+            roster,Cara
+            together,Amy,Bob
+            apart,Amy,Dan,Emma
+
+        Args:
+            source (Source): Path to the file, or an open text file.
+            **kwargs: Other arguments for `SeatingChart`, e.g. `max_size`.
+
+        Returns:
+            SeatingChart: Seating chart of the records in `source`.
+        """
+        with _open_source(source, newline="") as fp:
+            return cls.__from_records(cls.__csv_records(fp), **kwargs)
+
+    @classmethod
+    def from_jsonl(cls, source: Source, **kwargs: Any) -> "SeatingChart":
+        """
+        Creates a SeatingChart from a JSON Lines file, read one line at a
+        time. Each line is an object with a single key, the kind of record.
+
+            {"roster": "Cara"}
+            {"together": ["Amy", "Bob"]}
+            {"apart": ["Amy", "Dan", "Emma"]}
+
+        Args:
+            source (Source): Path to the file, or an open text file.
+            **kwargs: Other arguments for `SeatingChart`, e.g. `max_size`.
+
+        Returns:
+            SeatingChart: Seating chart of the records in `source`.
+        """
+        with _open_source(source) as fp:
+            return cls.__from_records(cls.__jsonl_records(fp), **kwargs)
+
+    @classmethod
+    def __from_records(cls, records: Records, **kwargs: Any) -> "SeatingChart":
+        """
+        Internal method that compiles a stream of records straight into a
+        `ConstraintSet`. Each name is stored once, however many records it
+        appears in.
+        """
+        names: Dict[str, str] = {}
+        roster: Group = []
+        pairs: Dict[str, List[Tuple[str, ...]]] = {"together": [], "apart": []}
+
+        for line, kind, items in records:
+            items = tuple(names.setdefault(item, item) for item in items)
+            if kind == "roster":
+                roster.extend(items)
+            elif kind in pairs:
+                if len(items) < 2:
+                    raise ValueError(
+                        f"Line {line}: `{kind}` records must name at least two "
+                        "individuals."
+                    )
+                pairs[kind].append(items)
+            else:
+                raise ValueError(f"Line {line}: unknown record kind `{kind}`.")
+
+        constraints = ConstraintSet(
+            roster or None, pairs["together"] or None, pairs["apart"] or None
+        )
+        chart = cls(constraints=constraints, **kwargs)
+        # Nothing else holds `constraints`, so `add()` can edit them in place.
+        chart.__shared = False
+        return chart
+
+    @staticmethod
+    def __csv_records(fp: IO[str]) -> Records:
+        """
+        Internal method that yields the non-empty rows of a CSV file as
+        records.
+        """
+        reader = csv.reader(fp)
+        for row in reader:
+            if not row or (reader.line_num == 1 and row[0] == "kind"):
+                continue
+            kind, *items = row
+            yield reader.line_num, kind, tuple(item for item in items if item)
+
+    @staticmethod
+    def __jsonl_records(fp: IO[str]) -> Records:
+        """
+        Internal method that yields the non-empty lines of a JSON Lines file
+        as records.
+        """
+        for line, text in enumerate(fp, 1):
+            if not text.strip():
+                continue
+            record = json.loads(text)
+            if not isinstance(record, dict) or len(record) != 1:
+                raise ValueError(f"Line {line}: records must have a single key.")
+            ((kind, items),) = record.items()
+            items = [items] if isinstance(items, str) else items
+            if not isinstance(items, list) or not all(
+                isinstance(item, str) for item in items
+            ):
+                raise ValueError(f"Line {line}: names must be strings.")
+            yield line, kind, tuple(items)
+
     # +----------------+
     # | Output Methods |
     # +----------------+
 
+    def iter_groups(self) -> Iterator[Group]:
+        """
+        Yields the groups of the seating chart one at a time, and creates it
+        if it doesn't already exist. In compact mode, only one group is
+        materialised at a time.
+
+        Yields:
+            Group: Names in a single group.
+        """
+        yield from self.__stored()
+
     def pretty(self) -> str:
         """
         Returns the seating chart as a pretty-printed string.
         """
-        output = "Seating Chart:\n"
-        for index, group in enumerate(self.chart):
-            output += f"    Group {index + 1}: {self.__list_to_oxford_comma(group)}\n"
-        return output
+        return "".join(self.__pretty_lines())
+
+    def write_pretty(self, fp: IO[str]) -> None:
+        """
+        Writes the seating chart to `fp` as pretty-printed text, one group at
+        a time.
+
+        Args:
+            fp (IO[str]): Open text file, or any object with a `write()`
+                method.
+        """
+        for line in self.__pretty_lines():
+            fp.write(line)
+
+    def write_csv(self, fp: IO[str]) -> None:
+        """
+        Writes the seating chart to `fp` as CSV, one row per individual with
+        the index of their group, one group at a time.
+
+            group,name
+            0,Amy
+            0,Bob
+
+        Args:
+            fp (IO[str]): Open text file, opened with `newline=""`.
+        """
+        writer = csv.writer(fp)
+        writer.writerow(["group", "name"])
+        for index, group in enumerate(self.iter_groups()):
+            writer.writerows([index, item] for item in group)
+
+    def write_json(self, fp: IO[str]) -> None:
+        """
+        Writes the seating chart to `fp` as a JSON array of groups, with one
+        group per line, one group at a time.
+
+        Args:
+            fp (IO[str]): Open text file, or any object with a `write()`
+                method.
+        """
+        separator = "[\n"
+        for group in self.iter_groups():
+            fp.write(separator + json.dumps(group))
+            separator = ",\n"
+        fp.write("[]\n" if separator == "[\n" else "\n]\n")
+
+    def __pretty_lines(self) -> Iterator[str]:
+        """
+        Helper method that yields the pretty-printed seating chart one line
+        at a time.
+        """
+        yield "Seating Chart:\n"
+        for index, group in enumerate(self.iter_groups()):
+            yield f"    Group {index + 1}: {self.__list_to_oxford_comma(group)}\n"
 
     def __list_to_oxford_comma(self, group: Group) -> str:
         """
@@ -510,3 +4003,268 @@ class SeatingChart:
             return " and ".join(group)
         else:
             return ", ".join(group[:-1]) + ", and " + group[-1]
+
+
+def _group_key(group: Group, argument: str) -> FrozenSet[str]:
+    """
+    Returns a pair or group from `together` or `apart` as an unordered key,
+    and ensures that it names at least two different individuals.
+    """
+    key = frozenset(group)
+    if len(key) < 2 or len(key) != len(group):
+        raise ValueError(
+            f"`{argument}` pairs and groups must name at least two different "
+            f"individuals: {list(group)}."
+        )
+    return key
+
+
+def _seat_component(
+    builder: _ChartBuilder, together: Pairs, apart: Pairs, max_size: Number
+) -> None:
+    """
+    Seats a single connected component of `together` and `apart` in an empty
+    `builder`, with the same `together` and `apart` stages as a whole chart.
+    """
+    clusters = _DisjointSet.from_pairs(together)
+    for group in sorted(clusters.groups(), key=len, reverse=True):
+        builder.add_group(group)
+    for group in apart:
+        for item in group:
+            if item not in builder:
+                builder.append(item, max_size)
+
+
+def _shard_pool(workers: int) -> ProcessPoolExecutor:
+    """
+    Returns the process pool with `workers` workers used for decomposing.
+    Each pool is started the first time it's needed, and then reused by every
+    SeatingChart until `shutdown_pools()`.
+    """
+    with _POOLS_LOCK:
+        if workers not in _POOLS:
+            _POOLS[workers] = ProcessPoolExecutor(max_workers=workers)
+        return _POOLS[workers]
+
+
+def shutdown_pools(wait: bool = True) -> None:
+    """
+    Shuts down the process pools started for decomposing, e.g. before a
+    long-running program stops generating charts. Pools are started again
+    when they're next needed.
+
+    Args:
+        wait (bool): Wait for the workers to exit. Defaults to `True`.
+    """
+    with _POOLS_LOCK:
+        pools = list(_POOLS.values())
+        _POOLS.clear()
+    for pool in pools:
+        pool.shutdown(wait=wait)
+
+
+def _solve_shard(
+    components: List[Tuple[Pairs, Pairs]], max_size: Number
+) -> Tuple[List[Chart], int]:
+    """
+    Process pool worker for `SeatingChart(decompose=True)`. Seats each
+    component of `together` and `apart` in `components` on its own, just as
+    the SeatingChart would, and returns the groups of every component with
+    the number of placement checks made.
+    """
+    charts, checks = [], 0
+    for together, apart in components:
+        builder = _ChartBuilder()
+        for group in apart:
+            if len(group) == 2:
+                builder.link(*group)
+            else:
+                builder.join(frozenset(group))
+        _seat_component(builder, together, apart, max_size)
+        charts.append(builder.groups)
+        checks += builder.checks
+    return charts, checks
+
+
+def _new_chart(settings: Dict[str, Any], seed: Hashable) -> Chart:
+    """
+    Process pool worker for `SeatingChart.anew()`. Generates a chart for a
+    `SeatingChart` built from `settings`.
+    """
+    return SeatingChart(**settings).new(seed)
+
+
+@contextmanager
+def _open_source(source: Source, **kwargs: Any) -> Iterator[IO[str]]:
+    """
+    Opens `source` for reading if it's a path. Open files are passed through,
+    and left open.
+    """
+    if hasattr(source, "read"):
+        yield source
+        return
+    with open(source, encoding="utf-8", **kwargs) as fp:
+        yield fp
+
+
+def _best_sample(
+    settings: Dict[str, Any], n: int, seed: int, score: Score
+) -> Tuple[float, Chart]:
+    """
+    Process pool worker for `SeatingChart.best_of()`. Samples `n` charts for
+    a `SeatingChart` built from `settings`, and returns the best one with its
+    score.
+    """
+    sc = SeatingChart(**settings)
+    scored = ((score(chart), chart) for chart in sc.sample(n, seed))
+    return min(scored, key=lambda result: result[0])
+
+
+def _run_jobs(jobs: List[Tuple[int, str]]) -> List[Dict[str, Any]]:
+    """
+    Process pool worker for `seatingchart batch`. Generates a chart for each
+    line of JSONL in `jobs`, and returns a result for each one, with the
+    error instead of the chart if it failed.
+    """
+    results = []
+    for line_num, line in jobs:
+        start = time.perf_counter()
+        result: Dict[str, Any] = {"id": line_num}
+        try:
+            job = json.loads(line)
+            if not isinstance(job, dict):
+                raise ValueError("Job must be a JSON object.")
+            result["id"] = job.pop("id", line_num)
+            unknown = sorted(set(job) - set(_JOB_KEYS))
+            if unknown:
+                raise ValueError(f"Unknown job keys: {unknown}.")
+            seed = job.pop("seed", None)
+            result["chart"] = SeatingChart(**job).new(seed)
+        except (ValueError, TypeError) as error:
+            result["error"] = f"{error.__class__.__name__}: {error}"
+        result["seconds"] = round(time.perf_counter() - start, 6)
+        results.append(result)
+    return results
+
+
+def _batch(args: argparse.Namespace) -> int:
+    """
+    Runs `seatingchart batch`. Jobs are read and sent to the workers in
+    chunks, with a bounded number of chunks in flight, so results stream out
+    while the input is still being read.
+
+    Returns:
+        int: Exit status, 1 if any job failed.
+    """
+    lines = (
+        (line_num, line)
+        for line_num, line in enumerate(args.input, start=1)
+        if line.strip()
+    )
+    chunks = iter(lambda: list(itertools.islice(lines, args.chunksize)), [])
+    failed = False
+
+    def write(results: List[Dict[str, Any]]) -> None:
+        nonlocal failed
+        for result in results:
+            failed = failed or "error" in result
+            args.output.write(json.dumps(result) + "\n")
+
+    workers = args.workers or os.cpu_count() or 1
+    if workers == 1:
+        for chunk in chunks:
+            write(_run_jobs(chunk))
+        return int(failed)
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending: Deque[Future] = deque()
+        for chunk in itertools.chain(chunks, [None]):
+            if chunk is not None:
+                pending.append(executor.submit(_run_jobs, chunk))
+                if len(pending) < workers * 2:
+                    continue
+            while pending:
+                if args.ordered:
+                    write(pending.popleft().result())
+                else:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        pending.remove(future)
+                        write(future.result())
+                if chunk is not None:
+                    break
+    return int(failed)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """
+    Entry point of the `seatingchart` console script.
+
+    Args:
+        argv (List[str]): Command line arguments. Defaults to `sys.argv`.
+
+    Returns:
+        int: Exit status.
+    """
+    parser = argparse.ArgumentParser(prog="seatingchart", description=__doc__)
+    parser.add_argument("--version", action="version", version=__version__)
+    commands = parser.add_subparsers(dest="command")
+    commands.required = True
+
+    batch = commands.add_parser(
+        "batch",
+        help="generate charts for jobs read as JSONL",
+        description=(
+            "Generate a chart for every job, one JSON object per line with "
+            f"any of {', '.join(_JOB_KEYS)} and an optional id. Results are "
+            "written as JSONL, with each job's id, chart or error, and seconds."
+        ),
+    )
+    batch.add_argument(
+        "input",
+        nargs="?",
+        type=argparse.FileType("r", encoding="utf-8"),
+        default=sys.stdin,
+        help="JSONL file of jobs (default: stdin)",
+    )
+    batch.add_argument(
+        "-o",
+        "--output",
+        type=argparse.FileType("w", encoding="utf-8"),
+        default=sys.stdout,
+        help="JSONL file of results (default: stdout)",
+    )
+    batch.add_argument(
+        "-w",
+        "--workers",
+        type=int,
+        default=None,
+        help="number of worker processes (default: number of CPUs)",
+    )
+    batch.add_argument(
+        "--chunksize",
+        type=int,
+        default=16,
+        help="jobs sent to a worker at a time (default: 16)",
+    )
+    batch.add_argument(
+        "--unordered",
+        dest="ordered",
+        action="store_false",
+        help="write results as they complete, instead of in input order",
+    )
+    batch.set_defaults(run=_batch)
+
+    args = parser.parse_args(argv)
+    if args.chunksize < 1 or (args.workers is not None and args.workers < 1):
+        parser.error("--workers and --chunksize must be positive integers")
+    try:
+        return args.run(args)
+    finally:
+        for fp in (args.input, args.output):
+            if fp not in (sys.stdin, sys.stdout):
+                fp.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
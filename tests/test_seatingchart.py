@@ -1,10 +1,23 @@
+import asyncio
+import csv
+import io
+import itertools
+import json
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
 from hypothesis import given
 import hypothesis.strategies as st
 import pytest
 
-from seatingchart import __version__
-from seatingchart import SeatingChart
-from seatingchart import PositiveInteger, GroupConflict
+from seatingchart import __version__, main
+from seatingchart import SeatingChart, Mixing, balance
+from seatingchart import ChartCache, ConstraintSet
+from seatingchart import Diversity, Preferences, Repeats, SizeVariance
+from seatingchart import PositiveInteger, GroupConflict, DuplicatePair, InvalidRequest
+from seatingchart import _ChartBuilder, _DisjointSet, _ExactSolver, _PackedChart
+from seatingchart import _POOLS, shutdown_pools
 
 from tests.strategies import not_int
 
@@ -74,7 +87,7 @@ class TestValidateIntegerInputs:
 class TestValidateTogetherApart:
     """
     SeatingChart's `together` and `apart` arguments rely on the
-    `__validate_together_apart()` method.
+    `ConstraintSet.__validate_together_apart()` method.
     """
 
     def test_together_only(self):
@@ -90,6 +103,26 @@ class TestValidateTogetherApart:
     def test_apart_together_disjoint(self):
         _ = SeatingChart(together=[["A", "B"]], apart=[["C", "D"]])
 
+    def test_duplicate_pairs(self):
+        with pytest.raises(DuplicatePair):
+            _ = SeatingChart(together=[["A", "B"], ["B", "A"]])
+        with pytest.raises(DuplicatePair):
+            _ = SeatingChart(apart=[["A", "B"], ["C", "D"], ["A", "B"]])
+
+    def test_transitive_conflict(self):
+        with pytest.raises(GroupConflict):
+            _ = SeatingChart(together=[["A", "B"], ["B", "C"]], apart=[["C", "A"]])
+
+    def test_roster_order(self):
+        sc = SeatingChart(roster=["D", "A", "D"], together=[["C", "A"]])
+        assert sc.roster == ["D", "A", "C"]
+
+    def test_validate_only(self, roster, together, apart):
+        constraints = SeatingChart.validate_only(roster, together, apart, 3)
+        assert constraints == ConstraintSet(roster, together, apart)
+        with pytest.raises(PositiveInteger):
+            _ = SeatingChart.validate_only(roster, max_size=0)
+
 
 class TestChart:
     """
@@ -158,6 +191,26 @@ class TestChart:
                 if person_1 in group:
                     assert person_2 not in group
 
+    def test_group_of(self, roster, together, apart):
+        sc = SeatingChart(roster=roster, together=together, apart=apart)
+
+        for name in roster:
+            index = sc.group_of(name)
+            assert name in sc.chart[index]
+        assert sc.group_of("Zed") is None
+
+    def test_chart_is_detached(self, roster, together):
+        sc = SeatingChart(roster=roster, together=together)
+        sc.chart[0].append("Zed")
+        assert sc.group_of("Zed") is None
+
+    def test_inputs_are_copied(self, roster, together):
+        sc = SeatingChart(roster=roster, together=together)
+        together[0].append("Zed")
+        roster.append("Zed")
+        assert "Zed" not in sc.together[0]
+        assert "Zed" not in sc.roster
+
 
 class TestInternalMethods:
     """
@@ -168,17 +221,1431 @@ class TestInternalMethods:
         sc = SeatingChart()
         value = "1"
 
-        nested_1 = [["0", "0", "0", "0"], ["0", "0", "0"], ["0", "0"]]
-        nested_1 = sc._SeatingChart__balance_nested_list(value, nested_1)
-        assert nested_1 == [["0", "0", "0", "0"], ["0", "0", "0"], ["0", "0", "1"]]
+        nested_1 = _ChartBuilder([["a", "b", "c", "d"], ["e", "f", "g"], ["h", "i"]])
+        sc._SeatingChart__balance_nested_list(value, nested_1)
+        assert nested_1.groups == [
+            ["a", "b", "c", "d"],
+            ["e", "f", "g"],
+            ["h", "i", "1"],
+        ]
 
-        nested_2 = [["0", "0", "0"], ["0", "0", "0"], ["0", "0", "0"]]
+        nested_2 = _ChartBuilder([["a", "b", "c"], ["d", "e", "f"], ["g", "h", "i"]])
         sc.max_size = 3
-        nested_2 = sc._SeatingChart__balance_nested_list(value, nested_2)
-        assert nested_2 == [["0", "0", "0"], ["0", "0", "0"], ["0", "0", "0"], ["1"]]
+        sc._SeatingChart__balance_nested_list(value, nested_2)
+        assert nested_2.groups == [
+            ["a", "b", "c"],
+            ["d", "e", "f"],
+            ["g", "h", "i"],
+            ["1"],
+        ]
 
-        nested_3 = [["0", "0", "0"], ["0", "0", "0"], ["0", "0", "0"]]
+        nested_3 = _ChartBuilder([["a", "b", "c"], ["d", "e", "f"], ["g", "h", "i"]])
         sc.max_size = None
         sc.num_groups = 3
-        nested_3 = sc._SeatingChart__balance_nested_list(value, nested_3)
-        assert nested_3 == [["0", "0", "0", "1"], ["0", "0", "0"], ["0", "0", "0"]]
+        sc._SeatingChart__balance_nested_list(value, nested_3)
+        assert nested_3.groups == [
+            ["a", "b", "c", "1"],
+            ["d", "e", "f"],
+            ["g", "h", "i"],
+        ]
+
+    def test_handle_together_bridges_groups(self):
+        together = [["A", "B"], ["C", "D"], ["E", "F"], ["B", "C"]]
+        sc = SeatingChart(together=together)
+        builder = _ChartBuilder()
+        sc._SeatingChart__handle_together(builder)
+        chart = builder.groups
+        assert sorted(map(sorted, chart)) == [["A", "B", "C", "D"], ["E", "F"]]
+        assert len(chart[0]) == 4
+
+    def test_disjoint_set(self):
+        clusters = _DisjointSet()
+        for item_1, item_2 in [("A", "B"), ("C", "D"), ("D", "A")]:
+            clusters.union(item_1, item_2)
+        clusters.add("E")
+
+        assert clusters.find("A") == clusters.find("C")
+        assert clusters.find("E") != clusters.find("A")
+        assert clusters.groups() == [["A", "B", "C", "D"], ["E"]]
+
+    def test_append_item_respects_later_apart_pairs(self):
+        apart = [["A", "B"], ["C", "D"], ["A", "C"]]
+        sc = SeatingChart(apart=apart)
+
+        for person_1, person_2 in apart:
+            assert sc.group_of(person_1) != sc.group_of(person_2)
+
+    def test_chart_builder_conflicts(self):
+        builder = _ChartBuilder([["A"], ["B"]], conflicts={"A": {"C"}, "C": {"A"}})
+        assert not builder.can_place("C", 0)
+        assert builder.can_place("C", 1)
+
+    def test_chart_builder_sizes(self):
+        builder = _ChartBuilder([["A", "B", "C"], ["D"], ["E"]])
+        assert builder.smallest() == (1, 1)
+        assert builder.largest() == 3
+
+        builder.place("F", 1)
+        builder.place("G", 2)
+        assert builder.smallest() == (2, 1)
+        builder.place("H", 1)
+        builder.place("I", 1)
+        assert builder.smallest() == (2, 2)
+        assert builder.largest() == 4
+
+    def test_chart_builder_append(self):
+        conflicts = {"C": {"E"}, "E": {"C"}}
+        builder = _ChartBuilder([["A", "B"], ["C"], ["D"]], conflicts=conflicts)
+        assert builder.append("E", 2) == 2
+        assert builder.checks == 2
+        assert builder.append("F", 2) == 1
+
+        builder.evict("A")
+        builder.evict("D")
+        builder.evict("E")
+        assert builder.append("G", 2) == 0
+        assert builder.append("H", 2) == 2
+        assert builder.append("I", 2) == 2
+        assert builder.groups == [["B", "G"], ["C", "F"], ["H", "I"]]
+        assert builder.append("J") == 0
+
+    def test_chart_builder_by_size(self):
+        builder = _ChartBuilder([["A", "B", "C"], ["D"], ["E", "F"]])
+        assert list(builder.by_size()) == [1, 2, 0]
+        assert list(builder.by_size(2)) == [1, 2]
+
+        builder.place("G", 1)
+        builder.place("H", 1)
+        builder.evict("A")
+        builder.evict("E")
+        builder.evict("F")
+        assert builder.groups == [["B", "C"], ["D", "G", "H"]]
+        assert list(builder.by_size()) == [0, 1]
+
+
+class TestCompact:
+    """
+    Test SeatingChart's compact, interned chart storage.
+    """
+
+    def test_compact_chart(self, roster, together, apart):
+        sc = SeatingChart(roster=roster, together=together, apart=apart, compact=True)
+        chart = sc.chart
+
+        assert sorted(itertools.chain(*chart)) == sorted(roster)
+        assert list(sc) == chart
+        assert len(sc) == len(chart)
+        for person_1, person_2 in apart:
+            assert sc.group_of(person_1) != sc.group_of(person_2)
+        for name in roster:
+            assert name in chart[sc.group_of(name)]
+        assert sc.group_of("Zed") is None
+
+    def test_packed_chart(self):
+        names = ("A", "B", "C", "D")
+        ids = {name: index for index, name in enumerate(names)}
+        packed = _PackedChart([["C", "A"], ["D"]], names, ids)
+
+        assert list(packed.members) == [2, 0, 3]
+        assert list(packed.offsets) == [0, 2, 3]
+        assert packed.unpack() == [["C", "A"], ["D"]]
+        assert packed.group_of("D") == 1
+        assert packed.group_of("B") is None
+
+    def test_slots(self, roster):
+        sc = SeatingChart(roster=roster)
+        with pytest.raises(AttributeError):
+            sc.unknown = True
+
+
+class TestIncremental:
+    """
+    Test SeatingChart's incremental `add()` and `remove()` methods.
+    """
+
+    @staticmethod
+    def locations(sc):
+        return {name: sc.group_of(name) for group in sc.chart for name in group}
+
+    def test_add_name(self, roster):
+        sc = SeatingChart(roster=roster, max_size=3)
+        before = self.locations(sc)
+        sc.add("Zed")
+
+        assert "Zed" in sc.roster
+        assert "Zed" in sc.chart[sc.group_of("Zed")]
+        assert all(sc.group_of(name) == index for name, index in before.items())
+        assert max(len(group) for group in sc.chart) <= 3
+
+    def test_add_name_num_groups(self):
+        sc = SeatingChart(["a", "b", "c", "d", "e"], max_size=2, num_groups=3)
+        sc.remove("e")
+        _ = sc.chart
+        sc.add("f")
+
+        assert len(sc.chart) <= 3
+        assert max(len(group) for group in sc.chart) <= 2
+
+    @pytest.mark.parametrize("compact", [False, True])
+    def test_add_name_over_capacity(self, compact):
+        sc = SeatingChart(
+            ["a", "b", "c", "d"], max_size=2, num_groups=2, compact=compact
+        )
+        before = sc.chart
+        with pytest.raises(InvalidRequest):
+            sc.add("e")
+
+        assert sc.roster == ["a", "b", "c", "d"]
+        assert sc.chart == before
+
+    @pytest.mark.parametrize("compact", [False, True])
+    def test_add_failure_is_atomic(self, compact):
+        roster = ["a", "b", "c", "d", "e", "f"]
+        sc = SeatingChart(roster, apart=[["a", "d"]], max_size=2, compact=compact)
+        before = sc.chart
+        with pytest.raises(InvalidRequest):
+            sc.add("g", together=[["a", "b"], ["b", "c"]])
+
+        assert sc.roster == roster
+        assert sc.together is None
+        assert sc.apart == [["a", "d"]]
+        assert sc.chart == before
+
+        sc.add("g", together=[["a", "b"]])
+        assert sc.group_of("a") == sc.group_of("b")
+        assert sc.group_of("g") is not None
+
+    def test_add_together(self, roster):
+        sc = SeatingChart(roster=roster, max_size=4)
+        sc.add(together=[["Amy", "Zed"]])
+        assert sc.group_of("Amy") == sc.group_of("Zed")
+        assert max(len(group) for group in sc.chart) <= 4
+
+    def test_add_apart_moves_one_person(self, roster):
+        sc = SeatingChart(roster=roster, together=[["Amy", "Bob"]], max_size=4)
+        before = self.locations(sc)
+        sc.add(apart=[["Bob", "Cara"]])
+        after = self.locations(sc)
+
+        assert after["Bob"] != after["Cara"]
+        assert after["Amy"] == after["Bob"]
+        moved = [name for name in before if before[name] != after[name]]
+        assert len(moved) <= 2
+
+    def test_add_conflict(self, roster):
+        sc = SeatingChart(roster=roster, together=[["Amy", "Bob"]])
+        with pytest.raises(GroupConflict):
+            sc.add(apart=[["Bob", "Amy"]])
+
+    def test_add_transitive_conflict(self, roster):
+        sc = SeatingChart(roster=roster, apart=[["Amy", "Cara"]])
+        with pytest.raises(GroupConflict):
+            sc.add(together=[["Amy", "Bob"], ["Bob", "Cara"]])
+        with pytest.raises(GroupConflict):
+            sc.add(together=[["Dan", "Emma"]], apart=[["Emma", "Dan"]])
+
+    def test_add_duplicate(self, roster):
+        sc = SeatingChart(roster=roster, apart=[["Amy", "Cara"]])
+        with pytest.raises(DuplicatePair):
+            sc.add(apart=[["Cara", "Amy"]])
+
+    def test_add_duplicate_together(self, roster):
+        sc = SeatingChart(roster=roster, together=[["Amy", "Bob", "Cara"]])
+        sc.add(together=[["Bob", "Cara"]])
+        with pytest.raises(DuplicatePair):
+            sc.add(together=[["Cara", "Bob"]])
+        with pytest.raises(DuplicatePair):
+            sc.add(together=[["Dan", "Emma"], ["Cara", "Amy", "Bob"]])
+        assert len(sc.together) == 2
+
+    def test_add_before_chart(self, roster):
+        sc = SeatingChart(roster=roster, max_size=2)
+        sc.add("Zed", together=[["Zed", "Amy"]], apart=[["Zed", "Bob"]])
+        assert sc.group_of("Zed") == sc.group_of("Amy")
+        assert sc.group_of("Zed") != sc.group_of("Bob")
+
+    def test_remove_name(self, roster, apart):
+        sc = SeatingChart(roster=roster, apart=apart)
+        before = self.locations(sc)
+        sc.remove("Dan")
+
+        assert "Dan" not in sc.roster
+        assert sc.group_of("Dan") is None
+        assert all("Dan" not in pair for pair in sc.apart)
+        assert sorted(itertools.chain(*sc.chart)) == sorted(set(roster) - {"Dan"})
+        for name, index in self.locations(sc).items():
+            assert len(sc.chart[index]) == len(
+                [n for n in before if before[n] == before[name] and n != "Dan"]
+            )
+
+    def test_remove_pairs(self, roster, together, apart):
+        sc = SeatingChart(roster=roster, together=together, apart=apart)
+        _ = sc.chart
+        sc.remove(together=[["Bob", "Amy"]], apart=[["Amy", "Dan"]])
+
+        assert ["Amy", "Bob"] not in sc.together
+        assert ["Amy", "Dan"] not in sc.apart
+        sc.add(together=[["Amy", "Dan"]])
+        assert sc.group_of("Amy") == sc.group_of("Dan")
+
+    def test_remove_splits_cluster(self, roster):
+        sc = SeatingChart(
+            roster=roster, together=[["Amy", "Bob"], ["Bob", "Cara"], ["Dan", "Emma"]]
+        )
+        _ = sc.chart
+        sc.remove("Bob")
+        sc.add(apart=[["Amy", "Cara"]])
+        sc.remove(together=[["Emma", "Dan"]])
+        sc.add(apart=[["Dan", "Emma"]])
+
+        assert sc.together == []
+        assert sorted(sc.roster) == sorted(set(roster) - {"Bob"})
+        assert sc.group_of("Amy") != sc.group_of("Cara")
+        assert sc.group_of("Dan") != sc.group_of("Emma")
+
+    def test_compact(self, roster):
+        sc = SeatingChart(roster=roster, max_size=3, compact=True)
+        _ = sc.chart
+        sc.add("Zed", apart=[["Zed", "Amy"]])
+        sc.remove("Bob")
+
+        assert sc.group_of("Zed") != sc.group_of("Amy")
+        assert sc.group_of("Bob") is None
+        assert sorted(itertools.chain(*sc.chart)) == sorted(
+            set(roster) - {"Bob"} | {"Zed"}
+        )
+
+    def test_compact_packs_on_read(self, roster, monkeypatch):
+        sc = SeatingChart(roster=roster, max_size=3, compact=True)
+        _ = sc.chart
+        packed = []
+
+        class CountingChart(_PackedChart):
+            def __init__(self, *args):
+                packed.append(args)
+                super().__init__(*args)
+
+        monkeypatch.setattr("seatingchart._PackedChart", CountingChart)
+        for name in ["Zed", "Yan", "Xia"]:
+            sc.add(name)
+            assert sc.group_of(name) is not None
+        sc.remove("Bob")
+        assert sc.group_of("Bob") is None
+        assert not packed
+
+        assert "Zed" in itertools.chain(*sc.chart)
+        assert len(packed) == 1
+
+
+class TestRebalance:
+    """
+    Test SeatingChart's minimal-move `update(rebalance=True)`.
+    """
+
+    def test_rebalance_max_size(self, roster, together):
+        sc = SeatingChart(roster=roster, together=together, num_groups=2)
+        original_chart = sc.chart
+        moves = sc.update(max_size=3, num_groups=None, rebalance=True)
+
+        assert max(len(group) for group in sc.chart) <= 3
+        assert len(moves) == len(roster) - 3 * len(original_chart)
+        for move in moves:
+            assert move.name in original_chart[move.source]
+            assert move.name in sc.chart[move.target]
+        for person_1, person_2 in together:
+            assert sc.group_of(person_1) == sc.group_of(person_2)
+
+    def test_rebalance_num_groups(self, roster, apart):
+        sc = SeatingChart(roster=roster, apart=apart, max_size=2)
+        original_chart = sc.chart
+        moves = sc.update(max_size=None, num_groups=3, rebalance=True)
+
+        assert len(sc.chart) == 3
+        moved = {move.name for move in moves}
+        stayed = [group for group in original_chart if moved.isdisjoint(group)]
+        assert len(stayed) >= 3
+        for person_1, person_2 in apart:
+            assert sc.group_of(person_1) != sc.group_of(person_2)
+
+    def test_rebalance_unchanged(self, roster):
+        sc = SeatingChart(roster=roster, max_size=3)
+        original_chart = sc.chart
+        assert sc.update(max_size=4, rebalance=True) == []
+        assert sc.chart == original_chart
+
+    def test_rebalance_infeasible(self, roster):
+        sc = SeatingChart(roster=roster, num_groups=2)
+        _ = sc.chart
+        with pytest.raises(InvalidRequest):
+            sc.update(max_size=2, rebalance=True)
+
+    @pytest.mark.parametrize("compact", [False, True])
+    def test_rebalance_infeasible_keeps_chart(self, roster, compact):
+        sc = SeatingChart(roster=roster, num_groups=2, compact=compact)
+        original_chart = sc.chart
+        with pytest.raises(InvalidRequest):
+            sc.update(max_size=2, rebalance=True)
+        assert sc.chart == original_chart
+
+    def test_rebalance_large(self):
+        names = [f"P{index}" for index in range(2000)]
+        sc = SeatingChart(roster=names, max_size=10)
+        original_chart = sc.new(seed=1)
+        moves = sc.update(max_size=9, rebalance=True)
+
+        assert len(moves) == len(original_chart)
+        assert max(len(group) for group in sc.chart) <= 9
+        assert len({move.target for move in moves}) == -(-len(moves) // 9)
+
+
+class TestSample:
+    """
+    Test SeatingChart's batch `sample()` method.
+    """
+
+    def test_sample(self, roster, together, apart):
+        sc = SeatingChart(roster=roster, together=together, apart=apart, max_size=3)
+        charts = list(sc.sample(20, seed=1))
+
+        assert len(charts) == 20
+        assert len({str(chart) for chart in charts}) > 1
+        for chart in charts:
+            assert sorted(itertools.chain(*chart)) == sorted(roster)
+            assert max(len(group) for group in chart) <= 3
+            location = {
+                name: index for index, group in enumerate(chart) for name in group
+            }
+            for person_1, person_2 in together:
+                assert location[person_1] == location[person_2]
+            for person_1, person_2 in apart:
+                assert location[person_1] != location[person_2]
+
+    def test_sample_seed(self, roster):
+        sc = SeatingChart(roster=roster, num_groups=3)
+        assert list(sc.sample(5, seed=7)) == list(sc.sample(5, seed=7))
+
+    def test_sample_keeps_chart(self, roster):
+        sc = SeatingChart(roster=roster, num_groups=3)
+        original_chart = sc.chart
+        _ = list(sc.sample(5))
+        assert sc.chart is original_chart
+
+
+def amy_group_size(chart):
+    return sum(len(group) for group in chart if "Amy" in group)
+
+
+class TestBestOf:
+    """
+    Test SeatingChart's parallel `best_of()` method.
+    """
+
+    def test_best_of(self, roster, together, apart):
+        sc = SeatingChart(roster=roster, together=together, apart=apart)
+        chart = sc.best_of(16, seed=3, workers=2)
+
+        assert chart == sc.chart
+        assert sorted(itertools.chain(*chart)) == sorted(roster)
+        for person_1, person_2 in apart:
+            assert sc.group_of(person_1) != sc.group_of(person_2)
+
+    def test_best_of_seed(self, roster):
+        sc_1 = SeatingChart(roster=roster, num_groups=3)
+        sc_2 = SeatingChart(roster=roster, num_groups=3)
+        assert sc_1.best_of(8, seed=5, workers=1) == sc_2.best_of(8, seed=5, workers=1)
+
+    def test_best_of_score(self, roster):
+        sc = SeatingChart(roster=roster, num_groups=3)
+        chart = sc.best_of(16, seed=1, workers=2, score=amy_group_size)
+        assert amy_group_size(chart) == 2
+        assert balance(chart) >= 0
+
+    def test_best_of_mixing(self, roster):
+        teams = {name: index % 2 for index, name in enumerate(roster)}
+        mixing = Mixing(teams)
+        sc = SeatingChart(roster=roster, num_groups=2)
+        chart = sc.best_of(16, seed=1, workers=2, score=mixing)
+
+        assert mixing([roster[::2], roster[1::2]]) == 32
+        assert mixing(chart) == 16
+
+
+class TestExact:
+    """
+    Test SeatingChart's exact solver fallback.
+    """
+
+    @pytest.fixture()
+    def tight(self):
+        return dict(
+            roster=list("ABCDEFGHIJKLM"),
+            together=[["L", "C"], ["E", "I"]],
+            apart=[["K", "E"], ["D", "F"], ["C", "K"], ["G", "K"]],
+            num_groups=2,
+        )
+
+    def test_greedy_fails(self, tight):
+        with pytest.raises(InvalidRequest):
+            _ = SeatingChart(**tight).chart
+
+    def test_exact_fallback(self, tight):
+        sc = SeatingChart(exact=True, **tight)
+
+        assert len(sc.chart) == 2
+        assert sorted(itertools.chain(*sc.chart)) == tight["roster"]
+        for person_1, person_2 in tight["together"]:
+            assert sc.group_of(person_1) == sc.group_of(person_2)
+        for person_1, person_2 in tight["apart"]:
+            assert sc.group_of(person_1) != sc.group_of(person_2)
+
+    def test_exact_fallback_stats(self, tight):
+        sc = SeatingChart(exact=True, profile=True, **tight)
+        _ = sc.chart
+
+        assert sc.stats.fallbacks == 1
+        assert sc.stats.charts == 1
+        assert sc.stats.placements["exact"] == len(tight["roster"])
+
+    def test_exact_sample(self, tight):
+        sc = SeatingChart(exact=True, profile=True, **tight)
+        charts = list(sc.sample(3, seed=1))
+
+        assert len(charts) == 3
+        assert sc.stats.fallbacks == 3
+        for chart in charts:
+            assert len(chart) == 2
+            assert sorted(itertools.chain(*chart)) == tight["roster"]
+
+    def test_best_of_exact(self, tight, monkeypatch):
+        pools = []
+
+        def recording_pool(*args, **kwargs):
+            pools.append(RecordingPool(*args, **kwargs))
+            return pools[-1]
+
+        monkeypatch.setattr("seatingchart.ProcessPoolExecutor", recording_pool)
+        sc = SeatingChart(exact=True, decompose=True, workers=4, **tight)
+        chart = sc.best_of(4, seed=1, workers=2)
+
+        assert len(chart) == 2
+        for person_1, person_2 in tight["apart"]:
+            assert sc.group_of(person_1) != sc.group_of(person_2)
+        (pool,) = pools
+        chunks = [chunk for (chunk,) in pool.calls]
+        assert len(chunks) == 2
+        for ((settings, *_),) in chunks:
+            assert settings["exact"] and settings["decompose"]
+            assert settings["num_groups"] == 2
+            assert settings["workers"] == 1
+
+    def test_exact_infeasible(self):
+        apart = [["A", "B"], ["B", "C"], ["A", "C"]]
+        sc = SeatingChart(apart=apart, num_groups=2, exact=True)
+        with pytest.raises(InvalidRequest):
+            _ = sc.chart
+
+    def test_exact_limit(self, tight):
+        sc = SeatingChart(exact=True, exact_limit=2, **tight)
+        with pytest.raises(InvalidRequest, match="exact_limit"):
+            _ = sc.chart
+
+        sc = SeatingChart(exact=True, exact_limit=None, **tight)
+        assert len(sc.chart) == 2
+
+    def test_exact_solver(self):
+        triangle = [0b110, 0b101, 0b011]
+        assert _ExactSolver([1, 1, 1], triangle, 2).solve() is None
+
+        colors = _ExactSolver([1, 1, 1], triangle, 3).solve()
+        assert sorted(colors) == [0, 1, 2]
+
+        colors = _ExactSolver([2, 1, 1], [0, 0, 0], 2, capacity=2).solve()
+        assert colors[1] == colors[2] != colors[0]
+
+        solver = _ExactSolver([1, 1, 1], triangle, 3, limit=1)
+        assert solver.solve() is None
+        assert solver.reached_limit
+
+
+class TestOptimize:
+    """
+    Test SeatingChart's local search `optimize()` method and objectives.
+    """
+
+    @pytest.fixture()
+    def teams(self, roster):
+        return {name: index % 2 for index, name in enumerate(roster)}
+
+    @staticmethod
+    def repeats(roster):
+        repeats = Repeats()
+        repeats.record([roster[:4], roster[4:]])
+        repeats.record([roster[::2], roster[1::2]])
+        return repeats
+
+    @pytest.mark.parametrize(
+        "name", ["size", "diversity", "preferences", "groups", "repeats"]
+    )
+    def test_incremental_deltas(self, roster, teams, name):
+        groups = {
+            ("Amy", "Bob", "Cara", "Dan"): 1.5,
+            ("Emma", "Felix"): -2.0,
+            ("Amy", "Gail", "Hank"): -0.5,
+        }
+        objective = {
+            "size": SizeVariance(),
+            "diversity": Diversity(teams),
+            "preferences": Preferences({("Amy", "Bob"): 2.0, ("Amy", "Cara"): -1.0}),
+            "groups": Preferences(groups),
+            "repeats": self.repeats(roster),
+        }[name]
+        builder = _ChartBuilder([roster[:3], roster[3:4], roster[4:]])
+        score = objective.reset(builder)
+        rng = random.Random(0)
+
+        for _ in range(50):
+            item, other = rng.sample(roster, 2)
+            source, target = builder.locations[item], builder.locations[other]
+            if source == target:
+                continue
+            if rng.random() < 0.5:
+                score += objective.swap_delta(builder, item, other)
+                builder.swap(item, other)
+                objective.moved(builder, item, source, target)
+                objective.moved(builder, other, target, source)
+            elif len(builder.groups[source]) > 1:
+                score += objective.move_delta(builder, item, target)
+                builder.move(item, target)
+                objective.moved(builder, item, source, target)
+            assert score == pytest.approx(objective.reset(builder))
+
+    def test_optimize_diversity(self, roster, together, apart, teams):
+        sc = SeatingChart(roster=roster, together=together, apart=apart, max_size=4)
+        before = Diversity(teams).reset(_ChartBuilder(sc.chart))
+        chart = sc.optimize(Diversity(teams), iterations=500, seed=1)
+        after = Diversity(teams).reset(_ChartBuilder(chart))
+
+        assert after <= before
+        assert max(len(group) for group in chart) <= 4
+        assert sorted(itertools.chain(*chart)) == sorted(roster)
+        for person_1, person_2 in together:
+            assert sc.group_of(person_1) == sc.group_of(person_2)
+        for person_1, person_2 in apart:
+            assert sc.group_of(person_1) != sc.group_of(person_2)
+
+    def test_optimize_size_variance(self, roster):
+        sc = SeatingChart(roster=roster, num_groups=2)
+        sc.remove(sc.chart[0][:3])
+        assert sorted(len(group) for group in sc.chart) == [1, 4]
+
+        chart = sc.optimize(iterations=200, seed=1)
+        assert sorted(len(group) for group in chart) == [2, 3]
+
+    @pytest.mark.parametrize("seed", range(5))
+    def test_optimize_annealing_keeps_best(self, roster, seed):
+        sc = SeatingChart(roster=roster, num_groups=2)
+        assert sorted(len(group) for group in sc.chart) == [4, 4]
+
+        chart = sc.optimize(iterations=20, seed=seed, temperature=10.0)
+        assert sorted(len(group) for group in chart) == [4, 4]
+        assert sorted(itertools.chain(*chart)) == sorted(roster)
+
+
+class TestStats:
+    """
+    Test SeatingChart's per-stage instrumentation.
+    """
+
+    def test_stats_disabled(self, roster):
+        sc = SeatingChart(roster=roster)
+        _ = sc.chart
+        assert sc.stats is None
+
+    def test_stats(self, roster, together, apart):
+        sc = SeatingChart(
+            roster=roster, together=together, apart=apart, max_size=3, profile=True
+        )
+        _ = sc.chart
+
+        assert set(sc.stats.timings) == {
+            "precheck",
+            "together",
+            "apart",
+            "remaining",
+            "validate",
+        }
+        assert sc.stats.placements["together"] == 4
+        assert sum(sc.stats.placements.values()) == len(roster)
+        assert sc.stats.checks > 0
+        assert sc.stats.charts == 1
+
+        sc.stats.reset()
+        _ = list(sc.sample(3))
+        assert sc.stats.charts == 3
+
+    def test_observer(self, roster, together, apart):
+        stages = []
+        sc = SeatingChart(
+            roster=roster,
+            together=together,
+            apart=apart,
+            observer=lambda stage, stats: stages.append(stage),
+        )
+        _ = sc.chart
+
+        assert stages == [
+            "precheck",
+            "together",
+            "apart",
+            "validate",
+            "remaining",
+            "validate",
+        ]
+        assert sc.stats.charts == 1
+
+
+class TestConstraintSet:
+    """
+    Test sharing compiled constraints and caching charts between
+    SeatingCharts.
+    """
+
+    def test_digest(self, roster, together, apart):
+        constraints = ConstraintSet(roster, together, apart)
+        reordered = ConstraintSet(
+            roster[::-1],
+            [pair[::-1] for pair in together],
+            [pair[::-1] for pair in apart[::-1]],
+        )
+
+        assert constraints == reordered
+        assert hash(constraints) == hash(reordered)
+        assert constraints.digest == reordered.digest
+        assert constraints != ConstraintSet(roster, together, apart[:1])
+
+    @pytest.mark.parametrize("max_size", [None, 2])
+    def test_large_apart_group(self, max_size):
+        names = [f"P{index}" for index in range(500)]
+        apart = [names[:400], names[:3]]
+        sc = SeatingChart(roster=names, apart=apart, max_size=max_size, profile=True)
+        chart = sc.new(seed=1)
+
+        assert len({sc.group_of(name) for name in names[:400]}) == 400
+        assert len(chart) == 400
+        assert sc.stats.checks < len(names)
+
+    def test_collision(self):
+        with pytest.raises(GroupConflict):
+            _ = ConstraintSet(together=[["A", "B"]], apart=[["B", "A"]])
+
+    def test_shared(self, roster, together, apart):
+        constraints = ConstraintSet(roster, together, apart)
+        sc_1 = SeatingChart(constraints=constraints, max_size=3)
+        sc_2 = SeatingChart(constraints=constraints, num_groups=2)
+
+        sc_1.add(apart=[["Amy", "Cara"]])
+        assert sc_1.constraints is None
+        assert sc_2.constraints is constraints
+        assert sc_2.apart == [list(pair) for pair in apart]
+        assert sc_1.apart == [list(pair) for pair in apart] + [["Amy", "Cara"]]
+        for chart in (sc_1.chart, sc_2.new()):
+            assert sorted(itertools.chain(*chart)) == sorted(roster)
+        assert sc_1.group_of("Amy") != sc_1.group_of("Cara")
+
+    def test_constraints_and_roster(self, roster):
+        with pytest.raises(ValueError):
+            _ = SeatingChart(roster, constraints=ConstraintSet(roster))
+
+    def test_seed(self, roster, apart):
+        sc = SeatingChart(roster=roster, apart=apart, max_size=3)
+        assert sc.new(seed=1) == sc.new(seed=1)
+
+    def test_cache(self, roster, together, apart):
+        cache = ChartCache(maxsize=1)
+        constraints = ConstraintSet(roster, together, apart)
+        sc_1 = SeatingChart(constraints=constraints, max_size=3, cache=cache)
+        sc_2 = SeatingChart(
+            roster=roster, together=together, apart=apart, max_size=3, cache=cache
+        )
+
+        chart = sc_1.new(seed=1)
+        assert sc_2.new(seed=1) == chart
+        assert (cache.hits, cache.misses) == (1, 1)
+
+        _ = sc_2.new(seed=2)
+        assert (constraints.digest, 3, None, False, False, 1) not in cache
+        assert len(cache) == 1
+
+    def test_cache_settings(self, roster, together, apart):
+        cache = ChartCache()
+        constraints = ConstraintSet(roster, together, apart)
+        _ = SeatingChart(constraints=constraints, cache=cache).new(seed=1)
+        _ = SeatingChart(constraints=constraints, cache=cache, exact=True).new(seed=1)
+        _ = SeatingChart(constraints=constraints, cache=cache, decompose=True).new(
+            seed=1
+        )
+        assert (cache.hits, len(cache)) == (0, 3)
+
+        sc = SeatingChart(constraints=constraints, cache=cache, time_budget_ms=5)
+        _ = sc.new(seed=1)
+        assert (cache.hits, len(cache)) == (0, 3)
+
+    def test_cache_size(self):
+        with pytest.raises(PositiveInteger):
+            _ = ChartCache(maxsize=0)
+
+
+class TestLoaders:
+    """
+    Test SeatingChart's streaming `from_csv()` and `from_jsonl()` loaders.
+    """
+
+    def test_from_csv(self, tmp_path, roster, together, apart):
+        rows = [["kind", "name", "other"]]
+        rows += [["roster", name] for name in roster]
+        rows += [["together", *pair] for pair in together]
+        rows += [["apart", *pair] for pair in apart]
+        path = tmp_path / "chart.csv"
+        path.write_text("\n".join(",".join(row) for row in rows) + "\n\n")
+
+        sc = SeatingChart.from_csv(str(path), max_size=3)
+        assert sc.constraints == ConstraintSet(roster, together, apart)
+        assert sc.max_size == 3
+        assert sorted(itertools.chain(*sc.chart)) == sorted(roster)
+
+    def test_from_jsonl(self, roster, together, apart):
+        records = [{"roster": roster[:4]}]
+        records += [{"roster": name} for name in roster[4:]]
+        records += [{"together": pair} for pair in together]
+        records += [{"apart": pair} for pair in apart]
+        fp = io.StringIO("\n".join(json.dumps(record) for record in records))
+
+        sc = SeatingChart.from_jsonl(fp, compact=True)
+        assert not fp.closed
+        assert sc.roster == roster
+        assert sc.together == together
+        assert sc.apart == apart
+
+        apart_list = sc.apart
+        sc.add(apart=[["Cara", "Emma"]])
+        assert sc.group_of("Cara") != sc.group_of("Emma")
+        assert sc.apart is apart_list
+        assert apart_list[-1] == ["Cara", "Emma"]
+
+    @pytest.mark.parametrize(
+        "text", ["seat,Amy\n", "together,Amy\n", "apart,Amy,Amy\n"]
+    )
+    def test_from_csv_invalid(self, text):
+        with pytest.raises(ValueError):
+            _ = SeatingChart.from_csv(io.StringIO(text))
+
+    @pytest.mark.parametrize(
+        "text", ['{"roster": 1}', '{"roster": "Amy", "apart": []}', "[]"]
+    )
+    def test_from_jsonl_invalid(self, text):
+        with pytest.raises(ValueError):
+            _ = SeatingChart.from_jsonl(io.StringIO(text))
+
+
+class TestOutput:
+    """
+    Test SeatingChart's `iter_groups()` and streaming writers.
+    """
+
+    @pytest.fixture()
+    def sc(self):
+        return SeatingChart(
+            roster=["Amy", "Bob", "Cara", "Dan"],
+            together=[["Amy", "Bob"], ["Bob", "Cara"]],
+            max_size=3,
+        )
+
+    def test_pretty(self, sc):
+        expected = "Seating Chart:\n    Group 1: Amy, Bob, and Cara\n    Group 2: Dan\n"
+        assert sc.pretty() == expected
+
+        fp = io.StringIO()
+        sc.write_pretty(fp)
+        assert fp.getvalue() == expected
+
+    def test_iter_groups(self, roster, together):
+        sc = SeatingChart(roster=roster, together=together, max_size=3, compact=True)
+        assert list(sc.iter_groups()) == sc.chart
+
+    def test_write_csv(self, sc):
+        fp = io.StringIO(newline="")
+        sc.write_csv(fp)
+        fp.seek(0)
+        rows = list(csv.reader(fp))
+
+        assert rows[0] == ["group", "name"]
+        assert rows[1:] == [
+            [str(index), item] for index, group in enumerate(sc.chart) for item in group
+        ]
+
+    def test_write_json(self, sc):
+        fp = io.StringIO()
+        sc.write_json(fp)
+        assert json.loads(fp.getvalue()) == sc.chart
+
+        fp = io.StringIO()
+        SeatingChart().write_json(fp)
+        assert json.loads(fp.getvalue()) == []
+
+
+def run(coroutine):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+class RecordingPool(ProcessPoolExecutor):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.calls = []
+
+    def submit(self, function, *args, **kwargs):
+        self.calls.append(args)
+        return super().submit(function, *args, **kwargs)
+
+
+class TestAsync:
+    """
+    Test SeatingChart's async `anew()` and `aupdate()` methods.
+    """
+
+    @pytest.fixture()
+    def slow(self, roster, together, apart):
+        stages = []
+
+        def observer(stage, stats):
+            stages.append(stage)
+            if stage == "together":
+                time.sleep(0.2)
+
+        sc = SeatingChart(
+            roster=roster, together=together, apart=apart, observer=observer
+        )
+        return sc, stages
+
+    def test_anew(self, roster, apart):
+        sc = SeatingChart(roster=roster, apart=apart, max_size=3)
+        chart = run(sc.anew(seed=1))
+
+        assert chart == sc.chart == SeatingChart(roster, None, apart, 3).new(seed=1)
+
+    def test_anew_process_pool(self, roster, apart):
+        sc = SeatingChart(roster=roster, apart=apart, num_groups=3, compact=True)
+        with ProcessPoolExecutor(max_workers=1) as executor:
+            chart = run(sc.anew(executor=executor))
+
+        assert chart == sc.chart
+        assert len(chart) <= 3
+        for person_1, person_2 in apart:
+            assert sc.group_of(person_1) != sc.group_of(person_2)
+
+    def test_anew_process_pool_settings(self, roster, apart):
+        preferences = {("Amy", "Bob"): 1.0}
+        sc = SeatingChart(
+            roster=roster,
+            apart=apart,
+            max_size=3,
+            exact=True,
+            time_budget_ms=5,
+            decompose=True,
+            workers=1,
+            preferences=preferences,
+        )
+        with RecordingPool(max_workers=1) as executor:
+            _ = run(sc.anew(executor=executor))
+
+        ((settings, _),) = executor.calls
+        assert settings["max_size"] == 3
+        assert settings["exact"] and settings["decompose"]
+        assert settings["time_budget_ms"] == 5
+        assert settings["workers"] == 1
+        assert settings["preferences"] == preferences
+
+    def test_anew_timeout(self, slow):
+        sc, stages = slow
+        with pytest.raises(asyncio.TimeoutError):
+            _ = run(sc.anew(timeout=0.05))
+
+        time.sleep(0.3)
+        assert stages == ["precheck", "together"]
+        assert sc.stats.charts == 0
+
+    def test_aupdate(self, roster):
+        sc = SeatingChart(roster=roster, max_size=4)
+        _ = sc.chart
+        moves = run(sc.aupdate(max_size=3, rebalance=True))
+
+        assert moves is not None
+        assert max(len(group) for group in sc.chart) <= 3
+
+    def test_aupdate_timeout(self, slow):
+        sc, stages = slow
+        with pytest.raises(asyncio.TimeoutError):
+            _ = run(sc.aupdate(num_groups=2, timeout=0.05))
+        assert sc.num_groups is None
+
+        sc.num_groups = 4
+        time.sleep(0.3)
+        assert sc.num_groups == 4
+        assert stages == ["precheck", "together"]
+
+    def test_concurrent_calls(self, slow):
+        sc, stages = slow
+
+        async def calls():
+            return await asyncio.gather(
+                sc.anew(seed=1, timeout=0.05), sc.anew(seed=2), return_exceptions=True
+            )
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            loop = asyncio.new_event_loop()
+            loop.set_default_executor(executor)
+            try:
+                timed_out, chart = loop.run_until_complete(calls())
+            finally:
+                loop.close()
+
+        assert isinstance(timed_out, asyncio.TimeoutError)
+        assert chart == sc.chart
+        assert stages.count("together") == 2
+        assert stages.count("apart") == 1
+
+
+class TestTimeBudget:
+    """
+    Test SeatingChart's time-budgeted generation.
+    """
+
+    def test_time_budget(self, roster, together, apart):
+        sc = SeatingChart(
+            roster=roster,
+            together=together,
+            apart=apart,
+            max_size=3,
+            time_budget_ms=20,
+            profile=True,
+        )
+        chart = sc.chart
+
+        assert sc.stats.retries > 0
+        assert sc.stats.charts == sc.stats.retries + 1
+        assert max(len(group) for group in chart) <= 3
+        for person_1, person_2 in apart:
+            assert sc.group_of(person_1) != sc.group_of(person_2)
+
+    def test_time_budget_score(self, roster):
+        sc = SeatingChart(roster=roster, num_groups=3)
+        chart = sc.new(seed=1, time_budget_ms=20, score=amy_group_size)
+        assert amy_group_size(chart) == 2
+
+    def test_time_budget_infeasible(self):
+        apart = [["A", "B"], ["B", "C"], ["C", "D"], ["D", "E"], ["E", "A"]]
+        sc = SeatingChart(apart=apart, num_groups=2)
+        with pytest.raises(InvalidRequest, match="attempts"):
+            _ = sc.new(time_budget_ms=5)
+
+    @pytest.mark.parametrize("time_budget_ms", [0, -1.5])
+    def test_time_budget_not_positive(self, time_budget_ms):
+        with pytest.raises(ValueError):
+            _ = SeatingChart(time_budget_ms=time_budget_ms)
+
+    def test_time_budget_not_number(self):
+        with pytest.raises(TypeError):
+            _ = SeatingChart(time_budget_ms="10")
+
+
+class TestRotations:
+    """
+    Test SeatingChart's multi-round `rotations()` method.
+    """
+
+    def test_rotations(self, roster, together, apart):
+        sc = SeatingChart(roster=roster, together=together, apart=apart, max_size=3)
+        chart = sc.chart
+        rounds = list(sc.rotations(4, seed=1))
+
+        assert len(rounds) == 4
+        assert sc.chart == chart
+        for groups in rounds:
+            assert sorted(itertools.chain(*groups)) == sorted(roster)
+            assert max(len(group) for group in groups) <= 3
+            locations = {item: i for i, group in enumerate(groups) for item in group}
+            for person_1, person_2 in together:
+                assert locations[person_1] == locations[person_2]
+            for person_1, person_2 in apart:
+                assert locations[person_1] != locations[person_2]
+
+    def test_rotations_avoid_repeats(self):
+        roster = [f"p{index}" for index in range(16)]
+        sc = SeatingChart(roster=roster, max_size=4, num_groups=4)
+
+        def total_repeats(rounds):
+            repeats, total = Repeats(), 0
+            for groups in rounds:
+                assert sorted(len(group) for group in groups) == [4, 4, 4, 4]
+                total += repeats.reset(_ChartBuilder(groups))
+                repeats.record(groups)
+            return total
+
+        assert total_repeats(sc.rotations(5, seed=0)) * 3 < total_repeats(
+            sc.sample(5, seed=0)
+        )
+
+    def test_repeats(self, roster):
+        repeats = Repeats()
+        repeats.record([roster[:4], roster[4:]])
+        repeats.record([roster[:2], roster[2:]])
+
+        assert repeats.meetings("Amy", "Bob") == 2
+        assert repeats.meetings("Bob", "Amy") == 2
+        assert repeats.meetings("Amy", "Emma") == 0
+        pairs = [roster[index : index + 2] for index in range(0, 8, 2)]
+        assert repeats.reset(_ChartBuilder(pairs)) == 8
+
+
+class TestDecompose:
+    """
+    Test SeatingChart's connected-component decomposition.
+    """
+
+    def assert_valid(self, sc, roster, together, apart):
+        chart = sc.chart
+        assert sorted(itertools.chain(*chart)) == sorted(roster)
+        for person_1, person_2 in together:
+            assert sc.group_of(person_1) == sc.group_of(person_2)
+        for person_1, person_2 in apart:
+            assert sc.group_of(person_1) != sc.group_of(person_2)
+
+    @pytest.mark.parametrize(
+        "max_size, num_groups", [(None, None), (3, None), (None, 3), (3, 3)]
+    )
+    def test_decompose(self, roster, together, apart, max_size, num_groups):
+        sc = SeatingChart(
+            roster=roster,
+            together=together,
+            apart=apart,
+            max_size=max_size,
+            num_groups=num_groups,
+            decompose=True,
+        )
+        self.assert_valid(sc, roster, together, apart)
+        if max_size is not None:
+            assert max(len(group) for group in sc.chart) <= max_size
+        if num_groups is not None:
+            assert len(sc.chart) == num_groups
+
+    def test_decompose_stage(self, roster, together, apart, monkeypatch):
+        stages = []
+        kwargs = dict(
+            roster=roster,
+            together=together,
+            apart=apart,
+            decompose=True,
+            observer=lambda stage, stats: stages.append(stage),
+        )
+        _ = SeatingChart(**kwargs).chart
+        assert stages[:3] == ["precheck", "together", "apart"]
+
+        stages.clear()
+        monkeypatch.setattr("seatingchart._POOL_THRESHOLD", 1)
+        sc = SeatingChart(**kwargs)
+        _ = sc.chart
+
+        assert stages[:2] == ["precheck", "decompose"]
+        assert "together" not in stages
+        assert sc.stats.placements["decompose"] == 6
+
+    def test_decompose_small_matches(self, roster, together, apart):
+        kwargs = dict(roster=roster, together=together, apart=apart, max_size=3)
+        chart = SeatingChart(**kwargs).new(seed=1)
+        assert SeatingChart(decompose=True, **kwargs).new(seed=1) == chart
+
+    def test_decompose_layout(self, monkeypatch):
+        monkeypatch.setattr("seatingchart._POOL_THRESHOLD", 1)
+        together = [["A", "B"], ["C", "D"], ["E", "F"], ["G", "H"]]
+        apart = [["I", "J"], ["K", "L"]]
+        chart = SeatingChart(together=together, apart=apart).chart
+
+        sc = SeatingChart(together=together, apart=apart, decompose=True)
+        assert sorted(map(sorted, sc.chart)) == sorted(map(sorted, chart))
+        assert len(sc.chart) == 4
+
+        sc = SeatingChart(together=together, num_groups=2, decompose=True)
+        assert sorted(map(len, sc.chart)) == [4, 4]
+
+    def test_decompose_workers(self, monkeypatch):
+        monkeypatch.setattr("seatingchart._SHARD_SIZE", 4)
+        monkeypatch.setattr("seatingchart._POOL_THRESHOLD", 20)
+        roster = [f"p{index:02d}" for index in range(40)]
+        together = [roster[index : index + 2] for index in range(0, 40, 4)]
+        apart = [[roster[index], roster[index + 2]] for index in range(0, 40, 4)]
+        kwargs = dict(
+            roster=roster,
+            together=together,
+            apart=apart,
+            max_size=4,
+            num_groups=10,
+            decompose=True,
+            profile=True,
+        )
+        sc = SeatingChart(workers=2, **kwargs)
+        self.assert_valid(sc, roster, together, apart)
+        assert max(len(group) for group in sc.chart) <= 4
+        assert sc.stats.checks > 0
+
+        pool = _POOLS[2]
+        chart = sc.new(seed=1)
+        assert _POOLS[2] is pool
+        assert SeatingChart(workers=1, **kwargs).new(seed=1) == chart
+
+        shutdown_pools()
+        assert not _POOLS
+        assert sc.new(seed=1) == chart
+        assert _POOLS[2] is not pool
+        shutdown_pools()
+
+    def test_decompose_oversized_cluster(self):
+        together = [["A", "B"], ["B", "C"], ["D", "E"]]
+        sc = SeatingChart(together=together, max_size=2, decompose=True)
+        with pytest.raises(InvalidRequest, match="3 individuals must sit together"):
+            _ = sc.chart
+
+
+class TestBatch:
+    """
+    Test the `seatingchart batch` command.
+    """
+
+    @pytest.fixture()
+    def jobs(self, tmp_path, roster, together, apart):
+        path = tmp_path / "jobs.jsonl"
+        lines = [
+            {"roster": roster, "together": together, "max_size": 3, "seed": 1},
+            {"id": "apart", "roster": roster, "apart": apart, "num_groups": 2},
+            {"apart": [["A", "B"], ["B", "C"], ["A", "C"]], "num_groups": 2},
+        ]
+        path.write_text("\n".join(json.dumps(line) for line in lines) + "\n\nnope\n")
+        return path
+
+    def results(self, path):
+        return [json.loads(line) for line in path.read_text().splitlines()]
+
+    @pytest.mark.parametrize("workers", ["1", "2"])
+    def test_batch(self, tmp_path, jobs, roster, together, workers):
+        output = tmp_path / "results.jsonl"
+        args = ["batch", str(jobs), "-o", str(output), "-w", workers]
+        assert main(args + ["--chunksize", "1"]) == 1
+
+        results = self.results(output)
+        assert [result["id"] for result in results] == [1, "apart", 3, 5]
+        assert all(result["seconds"] >= 0 for result in results)
+        sc = SeatingChart(roster=roster, together=together, max_size=3)
+        assert results[0]["chart"] == sc.new(seed=1)
+        assert len(results[1]["chart"]) == 2
+        assert results[2]["error"].startswith("InvalidRequest")
+        assert results[3]["error"].startswith("JSONDecodeError")
+
+    def test_batch_unordered(self, tmp_path, jobs):
+        output = tmp_path / "results.jsonl"
+        assert main(["batch", str(jobs), "-o", str(output), "--unordered"]) == 1
+        ids = [result["id"] for result in self.results(output)]
+        assert sorted(ids, key=str) == [1, 3, 5, "apart"]
+
+    def test_batch_stdin(self, monkeypatch, capsys, roster):
+        job = json.dumps({"roster": roster, "num_groups": 2})
+        monkeypatch.setattr("sys.stdin", io.StringIO(job + "\n"))
+        assert main(["batch", "-w", "1"]) == 0
+
+        (result,) = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+        assert sorted(itertools.chain(*result["chart"])) == sorted(roster)
+
+    def test_batch_unknown_key(self, monkeypatch, capsys):
+        monkeypatch.setattr("sys.stdin", io.StringIO('{"roster": ["A"], "size": 1}'))
+        assert main(["batch", "-w", "1"]) == 1
+        assert "Unknown job keys: ['size']" in capsys.readouterr().out
+
+
+class TestPrecheck:
+    """
+    Test the bounds that reject impossible inputs before generation.
+    """
+
+    def test_cluster_too_large(self, roster):
+        together = [["Amy", "Bob"], ["Bob", "Cara"], ["Dan", "Emma"]]
+        sc = SeatingChart(roster=roster, together=together, max_size=2)
+        with pytest.raises(InvalidRequest, match=r"3 .*\(Amy, Bob, Cara\).* is 2"):
+            _ = sc.chart
+
+    def test_apart_clique(self, roster):
+        apart = [list(pair) for pair in itertools.combinations(roster[:4], 2)]
+        apart.append(["Emma", "Amy"])
+        sc = SeatingChart(roster=roster, apart=apart, num_groups=3, profile=True)
+        with pytest.raises(InvalidRequest, match="4 individuals .* is 3"):
+            _ = sc.chart
+        assert not sc.stats.timings
+
+        sc.update(num_groups=4)
+        assert len(sc.chart) == 4
+
+    def test_apart_clique_of_clusters(self):
+        together = [["A", "B"], ["C", "D"]]
+        apart = [["A", "C"], ["B", "E"], ["D", "E"]]
+        sc = SeatingChart(together=together, apart=apart, num_groups=2, exact=True)
+        with pytest.raises(InvalidRequest, match="3 individuals or `together`"):
+            _ = sc.chart
+        assert sc.stats is None
+
+    def test_capacity(self, roster):
+        sc = SeatingChart(roster=roster, max_size=2, num_groups=3)
+        with pytest.raises(InvalidRequest, match="8 individuals, but only 2 x 3 = 6"):
+            _ = sc.chart
+
+    def test_sample(self, roster):
+        sc = SeatingChart(roster=roster, max_size=2, num_groups=3)
+        with pytest.raises(InvalidRequest, match="seats"):
+            _ = next(sc.sample(1))
+
+    def test_validate_only(self, roster):
+        with pytest.raises(InvalidRequest, match="seats"):
+            _ = SeatingChart.validate_only(roster=roster, max_size=2, num_groups=3)
+
+
+class TestGroups:
+    """
+    Test `together` and `apart` groups of more than two individuals, and
+    weighted preferences.
+    """
+
+    def test_together_group(self, roster):
+        together = [["Amy", "Bob", "Cara"], ["Dan", "Emma"]]
+        sc = SeatingChart(roster=roster, together=together, max_size=3)
+
+        assert len({sc.group_of(name) for name in together[0]}) == 1
+        assert sc.group_of("Dan") == sc.group_of("Emma")
+        assert max(len(group) for group in sc.chart) <= 3
+
+    def test_apart_group(self, roster):
+        apart = [["Amy", "Bob", "Cara", "Dan"], ["Emma", "Felix"]]
+        sc = SeatingChart(roster=roster, apart=apart, num_groups=4)
+        constraints = sc.constraints
+
+        assert len({sc.group_of(name) for name in apart[0]}) == 4
+        assert sc.group_of("Emma") != sc.group_of("Felix")
+        assert constraints.conflicts == {"Emma": {"Felix"}, "Felix": {"Emma"}}
+        assert constraints.memberships["Amy"] == [frozenset(apart[0])]
+
+    def test_apart_group_too_large(self, roster):
+        sc = SeatingChart(roster=roster, apart=[roster[:4]], num_groups=3)
+        with pytest.raises(InvalidRequest, match="4 individuals"):
+            _ = sc.chart
+
+    def test_collision(self):
+        with pytest.raises(GroupConflict):
+            _ = SeatingChart(together=[["A", "B", "C"]], apart=[["D", "C", "A"]])
+        with pytest.raises(GroupConflict):
+            _ = SeatingChart(together=[["A", "B"], ["C", "D"]], apart=[["A", "E", "B"]])
+
+    def test_duplicate_group(self):
+        with pytest.raises(DuplicatePair, match="group"):
+            _ = SeatingChart(apart=[["A", "B", "C"], ["C", "B", "A"]])
+
+    @pytest.mark.parametrize("group", [["A"], ["A", "A"], ["A", "B", "A"]])
+    def test_invalid_group(self, group):
+        with pytest.raises(ValueError, match="two different"):
+            _ = SeatingChart(apart=[group])
+
+    def test_exact(self):
+        together = [["A", "B"]]
+        apart = [["E", "D", "G"], ["B", "F", "D"], ["F", "B", "C"], ["F", "G"]]
+        sc = SeatingChart(
+            together=together, apart=apart, num_groups=3, exact=True, profile=True
+        )
+
+        assert len(sc.chart) == 3
+        assert sc.stats.fallbacks == 1
+        assert sc.group_of("A") == sc.group_of("B")
+        for group in apart:
+            assert len({sc.group_of(name) for name in group}) == len(group)
+
+    def test_decompose(self, roster):
+        apart = [roster[:3], roster[5:]]
+        sc = SeatingChart(roster=roster, apart=apart, num_groups=3, decompose=True)
+        for group in apart:
+            assert len({sc.group_of(name) for name in group}) == 3
+
+    def test_add(self, roster):
+        sc = SeatingChart(roster=roster, together=[roster[:4]])
+        _ = sc.chart
+        sc.remove(together=[roster[:4]])
+        sc.add("Ivy", apart=[["Amy", "Bob", "Ivy"]], together=[["Cara", "Dan", "Ivy"]])
+
+        assert len({sc.group_of(name) for name in ["Amy", "Bob", "Ivy"]}) == 3
+        assert len({sc.group_of(name) for name in ["Cara", "Dan", "Ivy"]}) == 1
+
+    def test_add_collision(self, roster):
+        sc = SeatingChart(roster=roster, apart=[["Amy", "Bob", "Cara"]])
+        with pytest.raises(GroupConflict):
+            sc.add(together=[["Bob", "Dan"], ["Dan", "Cara"]])
+        with pytest.raises(DuplicatePair):
+            sc.add(apart=[["Cara", "Amy", "Bob"]])
+
+    def test_remove_member(self, roster):
+        sc = SeatingChart(
+            roster=roster, together=[roster[5:]], apart=[["Amy", "Bob", "Cara"]]
+        )
+        _ = sc.chart
+        sc.remove("Cara")
+        sc.remove("Hank")
+
+        assert sc.apart == [["Amy", "Bob"]]
+        assert sc.together == [["Felix", "Gail"]]
+        sc.update(num_groups=2, rebalance=True)
+        assert sc.group_of("Amy") != sc.group_of("Bob")
+        assert sc.group_of("Felix") == sc.group_of("Gail")
+
+    def test_from_csv(self, roster):
+        text = "together,Amy,Bob,Cara\napart,Amy,Dan,Emma\n"
+        sc = SeatingChart.from_csv(io.StringIO(text), max_size=3)
+
+        assert sc.together == [["Amy", "Bob", "Cara"]]
+        assert len({sc.group_of(name) for name in ["Amy", "Dan", "Emma"]}) == 3
+
+    def test_optimize(self, roster):
+        apart = [["Amy", "Emma", "Gail"]]
+        preferences = {("Amy", "Bob", "Cara", "Dan"): 1.0, ("Emma", "Felix"): -1.0}
+        sc = SeatingChart(
+            roster=roster, apart=apart, max_size=4, preferences=preferences
+        )
+        before = Preferences(preferences).reset(_ChartBuilder(sc.chart))
+        chart = sc.optimize(iterations=2000, seed=1)
+
+        assert Preferences(preferences).reset(_ChartBuilder(chart)) < before
+        assert len({sc.group_of(name) for name in apart[0]}) == 3
+
+    def test_preferences(self, roster):
+        preferences = Preferences({tuple(roster[:3]): 2.0, tuple(roster[3:5]): -1.0})
+        chart = [roster[:5], roster[5:]]
+        assert preferences.reset(_ChartBuilder(chart)) == -2.0 * 3 + 1.0
+
+    def test_preferences_invalid(self):
+        with pytest.raises(ValueError):
+            _ = SeatingChart(preferences={("A",): 1.0})
+        with pytest.raises(TypeError):
+            _ = SeatingChart(preferences={("A", "B"): "1"})
+
+    def test_large_groups(self):
+        roster = [f"p{index:04d}" for index in range(2000)]
+        together = [roster[index : index + 10] for index in range(0, 1000, 10)]
+        apart = [roster[1000::10], roster[1001::10]]
+        sc = SeatingChart(roster=roster, together=together, apart=apart, max_size=100)
+        for group in together:
+            assert len({sc.group_of(name) for name in group}) == 1
+        for group in apart:
+            assert len({sc.group_of(name) for name in group}) == len(group)